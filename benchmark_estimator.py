@@ -0,0 +1,100 @@
+import math
+import time
+import random
+import estimator
+
+BALANCE_LOOP_TIME_STEP = 0.005
+COMPLEMENTARY_FACTOR   = 0.998
+
+SIMULATION_DURATION = 60.0
+SIMULATION_SEED     = 1234
+WARM_UP_DURATION    = 2.0
+
+# Simulated sensors: loop jitter, gyroscope bias/noise (deg/s), accelerometer angle noise & bumps (deg)
+TIME_DELTA_JITTER    = 0.001
+GYROSCOPE_BIAS       = 1.5
+GYROSCOPE_BIAS_WALK  = 0.01
+GYROSCOPE_NOISE      = 0.3
+ACCELEROMETER_NOISE  = 1.0
+BUMP_PERIOD          = 2.0
+BUMP_DURATION        = 0.05
+BUMP_AMPLITUDE       = 5.0
+
+
+def generate_data():
+
+    generator = random.Random(SIMULATION_SEED)
+
+    timestamps  = []
+    true_angles = []
+    angles      = []
+    rates       = []
+
+    timestamp = 0.0
+    bias      = GYROSCOPE_BIAS
+
+    while timestamp < SIMULATION_DURATION:
+
+        timestamp += BALANCE_LOOP_TIME_STEP + generator.uniform(-TIME_DELTA_JITTER / 2, TIME_DELTA_JITTER / 2)
+        bias      += generator.gauss(0, GYROSCOPE_BIAS_WALK)
+
+        # Robot wobbling around its equilibrium
+        true_angle = 3.0 * math.sin(2 * math.pi * 0.5 * timestamp) + 1.5 * math.sin(2 * math.pi * 1.7 * timestamp)
+        true_rate  = 3.0 * 2 * math.pi * 0.5 * math.cos(2 * math.pi * 0.5 * timestamp) + 1.5 * 2 * math.pi * 1.7 * math.cos(2 * math.pi * 1.7 * timestamp)
+
+        angle = true_angle + generator.gauss(0, ACCELEROMETER_NOISE)
+        if timestamp % BUMP_PERIOD < BUMP_DURATION:
+            angle += BUMP_AMPLITUDE
+
+        timestamps.append (timestamp)
+        true_angles.append(true_angle)
+        angles.append     (angle)
+        rates.append      (true_rate + bias + generator.gauss(0, GYROSCOPE_NOISE))
+
+    return timestamps, true_angles, angles, rates
+
+
+def run_benchmark(name, attitude_estimator, timestamps, true_angles, angles, rates):
+
+    samples_count  = len(timestamps)
+    estimates      = [0.0] * samples_count
+    last_timestamp = 0.0
+
+    start_time = time.perf_counter()
+
+    for i in range(0, samples_count):
+        estimates[i]   = attitude_estimator.update(angles[i], rates[i], timestamps[i] - last_timestamp)
+        last_timestamp = timestamps[i]
+
+    elapsed_time = time.perf_counter() - start_time
+
+    errors = [estimates[i] - true_angles[i] for i in range(0, samples_count) if timestamps[i] > WARM_UP_DURATION]
+
+    rms_error = math.sqrt(sum([error ** 2 for error in errors]) / len(errors))
+    max_error = max([abs(error) for error in errors])
+
+    print("{:<22}: {:5.2f} us per update / RMS error = {:5.3f} deg / max error = {:5.3f} deg".format(name, elapsed_time * 1000000 / samples_count, rms_error, max_error))
+
+
+def main():
+
+    timestamps, true_angles, angles, rates = generate_data()
+
+    print("")
+    print("Attitude estimators benchmark, {} simulated samples".format(len(timestamps)))
+    print("")
+
+    run_benchmark("Complementary filter", estimator.ComplementaryFilter(COMPLEMENTARY_FACTOR, BALANCE_LOOP_TIME_STEP), timestamps, true_angles, angles, rates)
+    run_benchmark("Kalman filter"       , estimator.KalmanFilter       ()                                            , timestamps, true_angles, angles, rates)
+
+    print("")
+
+
+if __name__ == '__main__':
+
+    try:
+
+        main()
+
+    except KeyboardInterrupt:
+        print("Keyboard interrupt...")
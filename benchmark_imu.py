@@ -0,0 +1,67 @@
+import time
+import i2c
+import imu
+import simulation
+
+BENCHMARK_LOOP_COUNT = 2000
+
+# Rough SMBus cost at 100 kHz: fixed ioctl/start/address/register overhead, then 9 bits per data byte
+TRANSACTION_TIME = 0.000100
+BYTE_TIME        = 0.000090
+
+
+def run_benchmark(name, imu_device, fake_device, read_function):
+
+    fake_device.reset_counters()
+
+    start_time = time.perf_counter()
+
+    for i in range(0, BENCHMARK_LOOP_COUNT):
+        read_function()
+        imu_device.compute_angles()
+        imu_device.compute_rates ()
+
+    elapsed_time = time.perf_counter() - start_time
+
+    transactions = fake_device.transactions_count / BENCHMARK_LOOP_COUNT
+    latency      = elapsed_time * 1000000 / BENCHMARK_LOOP_COUNT
+
+    print("{:<28}: {:5.1f} transactions / {:7.1f} us per iteration".format(name, transactions, latency))
+
+    return latency
+
+
+def main():
+
+    print("")
+    print("IMU read benchmark, {} iterations against a fake SMBus".format(BENCHMARK_LOOP_COUNT))
+    print("")
+
+    for transaction_time, byte_time in [(0.0, 0.0), (TRANSACTION_TIME, BYTE_TIME)]:
+
+        fake_device = simulation.FakeMpu6050(transaction_time, byte_time)
+        fake_device.set_sensor_data(-120, 310, 16012, -1530, 42, -17, 8)
+
+        imu_device = imu.ImuDevice(i2c.I2cDevice(fake_device, imu.IMU_ADDRESS))
+
+        print("Transaction time = {:.0f} us / Byte time = {:.0f} us".format(transaction_time * 1000000, byte_time * 1000000))
+
+        def read_words():
+            imu_device.read_acceleration_data()
+            imu_device.read_gyroscope_data   ()
+
+        words_latency = run_benchmark("Word reads (accel + gyro)", imu_device, fake_device, read_words         )
+        block_latency = run_benchmark("Block read (read_all)"    , imu_device, fake_device, imu_device.read_all)
+
+        print("Speedup                     : {:5.2f}x".format(words_latency / block_latency))
+        print("")
+
+
+if __name__ == '__main__':
+
+    try:
+
+        main()
+
+    except KeyboardInterrupt:
+        print("Keyboard interrupt...")
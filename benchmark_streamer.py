@@ -0,0 +1,113 @@
+import time
+import socket
+import threading
+import multiprocessing
+import streamer
+import simulation
+
+BENCHMARK_DURATION = 3.0
+VIEWERS_COUNTS     = [1, 2, 4, 8, 16]
+SERVER_ADDRESS     = ('127.0.0.1', 8123)
+
+# Camera stub, close to robot's settings (12 fps, 360x240 MJPEG)
+FRAME_RATE = 12
+FRAME_SIZE = 20000
+
+
+def viewer_thread(results, index, duration):
+
+    client_socket = socket.create_connection(SERVER_ADDRESS)
+    client_socket.sendall(b'GET /stream.mjpg HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    client_socket.settimeout(1.0)
+
+    received_bytes = 0
+    end_time       = time.monotonic() + duration
+
+    try:
+        while time.monotonic() < end_time:
+            data = client_socket.recv(65536)
+            if not data:
+                break
+            received_bytes += len(data)
+    except socket.timeout:
+        pass
+
+    client_socket.close()
+
+    results[index] = received_bytes
+
+
+def viewers_process(viewers_count, duration, connection):
+
+    # Viewers run in their own process, so that their CPU usage is not accounted to the server
+    results = [0] * viewers_count
+    threads = [threading.Thread(target = viewer_thread, args = [results, i, duration]) for i in range(0, viewers_count)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    connection.send(results)
+
+
+def run_benchmark(name, server, viewers_count):
+
+    server_thread = threading.Thread(target = server.serve_forever, args = [], daemon = True)
+    server_thread.start()
+
+    time.sleep(0.2)
+
+    parent_connection, child_connection = multiprocessing.Pipe()
+
+    viewers = multiprocessing.Process(target = viewers_process, args = [viewers_count, BENCHMARK_DURATION, child_connection])
+    viewers.start()
+
+    start_cpu_time = time.process_time()
+    start_time     = time.perf_counter()
+
+    viewers.join()
+
+    cpu_time     = time.process_time() - start_cpu_time
+    elapsed_time = time.perf_counter() - start_time
+    results      = parent_connection.recv()
+
+    server.shutdown()
+    server_thread.join(1.0)
+
+    frames_per_second = sum(results) / FRAME_SIZE / max(viewers_count, 1) / elapsed_time
+
+    print("{:<10} ({} viewers): {:5.1f} % CPU / {:5.1f} frames per second per viewer".format(name, viewers_count, cpu_time * 100 / elapsed_time, frames_per_second))
+
+    return cpu_time / elapsed_time
+
+
+def main():
+
+    camera = simulation.FakeCamera(FRAME_RATE, FRAME_SIZE)
+    camera.start_recording(streamer.streaming_output, format = 'mjpeg')
+
+    print("")
+    print("MJPEG streaming benchmark, {:.0f} s per run, {} fps / {} bytes frames".format(BENCHMARK_DURATION, FRAME_RATE, FRAME_SIZE))
+    print("")
+
+    for viewers_count in VIEWERS_COUNTS:
+
+        threaded_cpu = run_benchmark("Threaded", streamer.StreamingServer(SERVER_ADDRESS, streamer.StreamingHandler)  , viewers_count)
+        asyncio_cpu  = run_benchmark("asyncio" , streamer.AsyncStreamingServer(SERVER_ADDRESS, streamer.streaming_output), viewers_count)
+
+        print("CPU ratio             : {:5.2f}x".format(threaded_cpu / asyncio_cpu))
+        print("")
+
+    camera.stop_recording()
+
+
+if __name__ == '__main__':
+
+    try:
+
+        main()
+
+    except KeyboardInterrupt:
+        print("Keyboard interrupt...")
@@ -0,0 +1,129 @@
+import time
+import queue
+import random
+import window
+
+BENCHMARK_LOOP_COUNT = 20000
+BENCHMARK_SEED       = 1234
+WINDOW_SIZES         = [10, 100, 1000]
+STATISTICS_SIZES     = [3, 5, 10, 100]
+
+
+def list_speed(readings, window_size):
+
+    distance_readings = []
+    current_speed     = 0.0
+
+    for reading in readings:
+
+        distance_readings.append(reading)
+
+        if len(distance_readings) > window_size:
+            distance_readings.pop(0)
+            current_speed = sum(distance_readings) / window_size
+
+    return current_speed
+
+
+def window_speed(readings, window_size):
+
+    distance_window = window.MovingWindow(window_size)
+    current_speed   = 0.0
+
+    for reading in readings:
+
+        distance_window.append(reading)
+
+        if distance_window.is_full():
+            current_speed = distance_window.get_sum() / window_size
+
+    return current_speed
+
+
+def queue_statistics(readings, window_size):
+
+    distance_samples  = queue.Queue()
+    number_of_samples = 0
+    distance_range    = 0.0
+
+    for reading in readings:
+
+        distance_samples.put(reading)
+        number_of_samples += 1
+
+        if number_of_samples >= window_size:
+            distance_range = max(list(distance_samples.queue)) - min(list(distance_samples.queue))
+            distance_samples.get()
+
+    return distance_range
+
+
+def rolling_statistics(readings, window_size):
+
+    distance_samples = window.RollingStatistics(window_size)
+    distance_range   = 0.0
+    distance_median  = 0.0
+
+    for reading in readings:
+
+        distance_samples.append(reading)
+
+        if distance_samples.is_full():
+            distance_range  = distance_samples.get_range ()
+            distance_median = distance_samples.get_median()
+
+    return distance_range
+
+
+def run_benchmark(name, function, readings, window_size):
+
+    start_time   = time.perf_counter()
+    result       = function(readings, window_size)
+    elapsed_time = time.perf_counter() - start_time
+
+    latency = elapsed_time * 1000000 / len(readings)
+
+    print("{:<14} (window = {:4}): {:6.2f} us per update - last result = {:.3f}".format(name, window_size, latency, result))
+
+    return latency
+
+
+def main():
+
+    generator = random.Random(BENCHMARK_SEED)
+    readings  = [generator.randint(-5, 5) for i in range(0, BENCHMARK_LOOP_COUNT)]
+
+    print("")
+    print("Speed moving window benchmark, {} updates".format(BENCHMARK_LOOP_COUNT))
+    print("")
+
+    for window_size in WINDOW_SIZES:
+
+        list_latency   = run_benchmark("List"         , list_speed  , readings, window_size)
+        window_latency = run_benchmark("Moving window", window_speed, readings, window_size)
+
+        print("Speedup                       : {:6.2f}x".format(list_latency / window_latency))
+        print("")
+
+    distances = [generator.uniform(5, 200) for i in range(0, BENCHMARK_LOOP_COUNT)]
+
+    print("Distance statistics benchmark (queue: range only, rolling: range & median), {} updates".format(BENCHMARK_LOOP_COUNT))
+    print("")
+
+    for window_size in STATISTICS_SIZES:
+
+        queue_latency   = run_benchmark("Queue/lists", queue_statistics  , distances, window_size)
+        rolling_latency = run_benchmark("Rolling"    , rolling_statistics, distances, window_size)
+
+        print("Speedup                       : {:6.2f}x".format(queue_latency / rolling_latency))
+        print("")
+
+
+if __name__ == '__main__':
+
+    try:
+
+        main()
+
+    except KeyboardInterrupt:
+        print("Keyboard interrupt...")
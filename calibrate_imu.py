@@ -1,12 +1,100 @@
 import os
 import json
 import imu
+import numpy
 
 SETUP_FILE = 'setup.json'
 
-CALIBRATION_LOOP_COUNT = 10000
+# Capture stops once offset estimates move less than tolerances (raw data units) between batches
+CALIBRATION_MAX_SAMPLES  = 10000
+CALIBRATION_MIN_SAMPLES  =  1000
+CALIBRATION_BATCH_SIZE   =   250
+ACCELERATION_TOLERANCE   =     4.0
+GYROSCOPE_TOLERANCE      =     1.0
 
-MOVING_STAR_PATTERN = ['/', '-', '\\', '|']
+# Ratio of lowest & highest samples discarded, on each side, by the trimmed mean
+CALIBRATION_TRIM_RATIO = 0.1
+
+AXES_NAMES   = ['X acceleration', 'Y acceleration', 'Z acceleration', 'X gyroscope   ', 'Y gyroscope   ', 'Z gyroscope   ']
+AXES_SCALES  = [imu.ACCELERATION_SCALE_FACTOR] * 3 + [imu.GYROSCOPE_SCALE_FACTOR] * 3
+AXES_UNITS   = ['g'] * 3 + ['deg/s'] * 3
+AXES_GRAVITY = [0, 0, int(imu.ACCELERATION_SCALE_FACTOR), 0, 0, 0]
+
+
+class ImuCalibrator:
+
+    def __init__(self, imu_device):
+
+        self.imu_device = imu_device
+
+        # Acceleration & gyroscope samples, preallocated for the longest possible capture
+        self.samples       = numpy.empty((CALIBRATION_MAX_SAMPLES, 6), dtype = numpy.int16)
+        self.samples_count = 0
+        self.is_converged  = False
+
+        self.tolerances = numpy.array([ACCELERATION_TOLERANCE] * 3 + [GYROSCOPE_TOLERANCE] * 3)
+        self.estimates  = numpy.zeros(6)
+
+    def __capture_batch__(self):
+
+        for i in range(self.samples_count, self.samples_count + CALIBRATION_BATCH_SIZE):
+
+            acceleration_x, acceleration_y, acceleration_z, temperature, gyroscope_x, gyroscope_y, gyroscope_z = self.imu_device.read_raw_data()
+
+            self.samples[i] = (acceleration_x, acceleration_y, acceleration_z, gyroscope_x, gyroscope_y, gyroscope_z)
+
+        self.samples_count += CALIBRATION_BATCH_SIZE
+
+    def get_trimmed_mean(self):
+
+        sorted_samples = numpy.sort(self.samples[:self.samples_count], axis = 0)
+        trimmed_count  = int(self.samples_count * CALIBRATION_TRIM_RATIO)
+
+        return sorted_samples[trimmed_count:self.samples_count - trimmed_count].mean(axis = 0)
+
+    def get_median(self):
+        return numpy.median(self.samples[:self.samples_count], axis = 0)
+
+    def get_standard_deviation(self):
+        return self.samples[:self.samples_count].std(axis = 0)
+
+    def capture(self):
+
+        while self.samples_count < CALIBRATION_MAX_SAMPLES:
+
+            self.__capture_batch__()
+
+            previous_estimates = self.estimates
+            self.estimates     = self.get_trimmed_mean()
+
+            print("\r{:5} samples captured".format(self.samples_count), end = '', flush = True)
+
+            if self.samples_count >= CALIBRATION_MIN_SAMPLES \
+            and (numpy.abs(self.estimates - previous_estimates) < self.tolerances).all():
+                self.is_converged = True
+                break
+
+        print("")
+
+    def get_offsets(self):
+        return [int(round(estimate)) - gravity for estimate, gravity in zip(self.estimates, AXES_GRAVITY)]
+
+    def print_calibration_info(self):
+
+        median             = self.get_median()
+        standard_deviation = self.get_standard_deviation()
+
+        print("")
+        print("Samples: {} - Converged: {}".format(self.samples_count, self.is_converged))
+        print("")
+
+        for i in range(0, 6):
+            print("{}: trimmed mean = {:8.1f} / median = {:8.1f} / noise = {:6.1f} ({:.4f} {})".format(AXES_NAMES[i],
+                                                                                                       self.estimates[i],
+                                                                                                       median[i],
+                                                                                                       standard_deviation[i],
+                                                                                                       standard_deviation[i] / AXES_SCALES[i],
+                                                                                                       AXES_UNITS[i]))
 
 
 def main():
@@ -29,54 +117,19 @@ def main():
 
     imu_device.print_imu_info()
 
-    x_acceleration_measure = 0
-    y_acceleration_measure = 0
-    z_acceleration_measure = 0
-
-    x_gyroscope_measure = 0
-    y_gyroscope_measure = 0
-    z_gyroscope_measure = 0
-
-    print("  ")
-
-    for i in range(0, CALIBRATION_LOOP_COUNT):
-        print("\b" + MOVING_STAR_PATTERN[i % 4], end = '', flush = True)
-
-        imu_device.read_acceleration_data()
-        imu_device.read_gyroscope_data   ()
-
-        x_acceleration_measure += imu_device.get_x_acceleration()
-        y_acceleration_measure += imu_device.get_y_acceleration()
-        z_acceleration_measure += imu_device.get_z_acceleration()
-
-        x_gyroscope_measure += imu_device.get_x_gyroscope()
-        y_gyroscope_measure += imu_device.get_y_gyroscope()
-        z_gyroscope_measure += imu_device.get_z_gyroscope()
-
-    x_acceleration_measure /= CALIBRATION_LOOP_COUNT
-    y_acceleration_measure /= CALIBRATION_LOOP_COUNT
-    z_acceleration_measure /= CALIBRATION_LOOP_COUNT
-
-    x_gyroscope_measure /= CALIBRATION_LOOP_COUNT
-    y_gyroscope_measure /= CALIBRATION_LOOP_COUNT
-    z_gyroscope_measure /= CALIBRATION_LOOP_COUNT
-
-    x_acceleration_offset = int(x_acceleration_measure)
-    y_acceleration_offset = int(y_acceleration_measure)
-    z_acceleration_offset = int(z_acceleration_measure) - 16384
+    print("")
 
-    x_gyroscope_offset = int(x_gyroscope_measure)
-    y_gyroscope_offset = int(y_gyroscope_measure)
-    z_gyroscope_offset = int(z_gyroscope_measure)
+    imu_calibrator = ImuCalibrator(imu_device)
+    imu_calibrator.capture()
+    imu_calibrator.print_calibration_info()
 
-    imu_device.set_x_acceleration_offset(x_acceleration_offset)
-    imu_device.set_y_acceleration_offset(y_acceleration_offset)
-    imu_device.set_z_acceleration_offset(z_acceleration_offset)
+    x_acceleration_offset, y_acceleration_offset, z_acceleration_offset, x_gyroscope_offset, y_gyroscope_offset, z_gyroscope_offset = imu_calibrator.get_offsets()
 
-    imu_device.set_x_gyroscope_offset(x_gyroscope_offset)
-    imu_device.set_y_gyroscope_offset(y_gyroscope_offset)
-    imu_device.set_z_gyroscope_offset(z_gyroscope_offset)
+    # Trim IMU's offset registers, then check data is now corrected by the IMU itself
+    imu_device.write_offsets(x_acceleration_offset, y_acceleration_offset, z_acceleration_offset,
+                             x_gyroscope_offset   , y_gyroscope_offset   , z_gyroscope_offset   )
 
+    print("")
     imu_device.print_imu_info()
 
     setup_data['ACCELERATION_X_OFFSET'] = x_acceleration_offset
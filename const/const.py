@@ -1,3 +1,4 @@
-USE_RPI_GPIO = 0
-USE_RPI_ZERO = 1
-USE_PI_GPIO  = 2
\ No newline at end of file
+USE_RPI_GPIO   = 0
+USE_RPI_ZERO   = 1
+USE_PI_GPIO    = 2
+USE_SIMULATION = 3
\ No newline at end of file
@@ -0,0 +1,2 @@
+from .controller import *
+from .replay import Replay, WARMUP_RECORDS
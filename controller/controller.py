@@ -0,0 +1,123 @@
+import pid
+import motor
+
+BALANCE_LOOP_TIME_STEP = 0.005
+
+# Measured time deltas are kept within sane bounds, whatever happens (first sample, stall, clock glitch...)
+MIN_TIME_DELTA = BALANCE_LOOP_TIME_STEP / 4
+MAX_TIME_DELTA = BALANCE_LOOP_TIME_STEP * 4
+
+DISTANCE_SAMPLES            = 100
+COMPLEMENTARY_FILTER_FACTOR = 0.998
+
+# Robot's speed step (in encoder cycles per second), speed orders being multiples of it
+TARGET_SPEED_STEP = 85
+
+# Default constants used by the speed PID controller (output range being twice robot's target speed step)
+SPEED_PID_KP     = 0.020
+SPEED_PID_KI     = 0.100
+SPEED_PID_KD     = 0.000
+SPEED_PID_TARGET = 0.000
+SPEED_PID_MIN    = -TARGET_SPEED_STEP * 2
+SPEED_PID_MAX    =  TARGET_SPEED_STEP * 2
+SPEED_PID_WINDUP = 0.025
+
+# Default constants used by the balance PID controller (output range being motors' PWM one)
+BALANCE_PID_KP     =  20.00
+BALANCE_PID_KI     = 100.00
+BALANCE_PID_KD     =   0.25
+BALANCE_PID_TARGET =  -2.50
+BALANCE_PID_MIN    = -motor.PWM_MAX
+BALANCE_PID_MAX    =  motor.PWM_MAX
+BALANCE_PID_WINDUP =  0.05
+
+
+def make_speed_pid(kp = SPEED_PID_KP, ki = SPEED_PID_KI, kd = SPEED_PID_KD):
+    return pid.Pid(kp, ki, kd, SPEED_PID_TARGET, SPEED_PID_MIN, SPEED_PID_MAX, SPEED_PID_WINDUP)
+
+
+def make_balance_pid(kp = BALANCE_PID_KP, ki = BALANCE_PID_KI, kd = BALANCE_PID_KD):
+    return pid.Pid(kp, ki, kd, BALANCE_PID_TARGET, BALANCE_PID_MIN, BALANCE_PID_MAX, BALANCE_PID_WINDUP)
+
+
+class BalanceController:
+
+    # Speed & balance computations of one balance loop iteration, free of any hardware access,
+    # so that they can be run on the robot as well as replayed or simulated
+
+    def __init__(self, speed_pid_controller, balance_pid_controller, distance_window, time_window):
+
+        self.speed_pid_controller   = speed_pid_controller
+        self.balance_pid_controller = balance_pid_controller
+        self.distance_window        = distance_window
+        self.time_window            = time_window
+
+        self.current_speed   = 0.0
+        self.target_angle    = 0.0
+        self.filtered_pitch  = 0.0
+        self.balance_command = 0.0
+
+    def set_distance_samples(self, distance_samples):
+
+        # Both windows at once, from the balance thread only: speed is never computed over mismatched windows
+        if distance_samples != self.distance_window.get_capacity():
+            self.distance_window.resize(distance_samples)
+            self.time_window.resize    (distance_samples)
+
+    def update_speed(self, distance, time_delta, target_speed, equilibrium_angle, measured_speed = None):
+
+        # Distance in encoder cycles travelled over time delta, or speed measured otherwise
+        self.speed_pid_controller.set_target(target_speed)
+
+        self.distance_window.append(distance)
+        self.time_window.append    (time_delta)
+
+        if measured_speed is not None:
+            self.current_speed = measured_speed
+        elif self.distance_window.is_full():
+            self.current_speed = self.distance_window.get_sum() / self.time_window.get_sum()
+        else:
+            self.current_speed = target_speed
+
+        self.target_angle = equilibrium_angle + self.speed_pid_controller.update(self.current_speed, self.time_window.get_sum())
+
+        self.balance_pid_controller.set_target(self.target_angle)
+
+        return self.target_angle
+
+    def update_attitude(self, attitude_estimator, pitch, pitch_rate, time_delta):
+
+        self.filtered_pitch = attitude_estimator.update(pitch, pitch_rate, time_delta)
+
+        return self.filtered_pitch
+
+    def update_balance(self, control_time_delta):
+
+        # No new IMU sample: keep previous balance command
+        if control_time_delta > 0:
+            self.balance_command = self.balance_pid_controller.update(self.filtered_pitch, min(control_time_delta, MAX_TIME_DELTA))
+
+        return self.balance_command
+
+    def set_state(self, filtered_pitch, balance_command):
+
+        self.filtered_pitch  = filtered_pitch
+        self.balance_command = balance_command
+
+    def get_speed_pid(self):
+        return self.speed_pid_controller
+
+    def get_balance_pid(self):
+        return self.balance_pid_controller
+
+    def get_current_speed(self):
+        return self.current_speed
+
+    def get_target_angle(self):
+        return self.target_angle
+
+    def get_filtered_pitch(self):
+        return self.filtered_pitch
+
+    def get_balance_command(self):
+        return self.balance_command
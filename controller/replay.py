@@ -0,0 +1,126 @@
+import math
+import array
+import window
+import recorder
+import estimator
+
+from .controller import BalanceController, BALANCE_LOOP_TIME_STEP, DISTANCE_SAMPLES
+
+# Records skipped by comparison, while replayed PIDs' integrators & windows settle
+WARMUP_RECORDS = 200
+
+TIME_INDEX               = recorder.RECORD_FIELDS.index('time'              )
+SPEED_TIME_DELTA_INDEX   = recorder.RECORD_FIELDS.index('speed_time_delta'  )
+CONTROL_TIME_DELTA_INDEX = recorder.RECORD_FIELDS.index('control_time_delta')
+RAW_DATA_INDEX           = recorder.RECORD_FIELDS.index('acceleration_x'    )
+PITCH_INDEX              = recorder.RECORD_FIELDS.index('pitch'             )
+SPEED_P_INDEX            = recorder.RECORD_FIELDS.index('speed_p'           )
+SPEED_I_INDEX            = recorder.RECORD_FIELDS.index('speed_i'           )
+BALANCE_P_INDEX          = recorder.RECORD_FIELDS.index('balance_p'         )
+BALANCE_I_INDEX          = recorder.RECORD_FIELDS.index('balance_i'         )
+BALANCE_OUTPUT_INDEX     = recorder.RECORD_FIELDS.index('balance_output'    )
+LEFT_TICKS_INDEX         = recorder.RECORD_FIELDS.index('left_ticks'        )
+RIGHT_TICKS_INDEX        = recorder.RECORD_FIELDS.index('right_ticks'       )
+TARGET_SPEED_INDEX       = recorder.RECORD_FIELDS.index('target_speed'      )
+EQUILIBRIUM_ANGLE_INDEX  = recorder.RECORD_FIELDS.index('equilibrium_angle' )
+
+RAW_DATA_WORDS = 7
+
+
+class Replay:
+
+    def __init__(self, imu_device, configuration, speed_pid_controller, balance_pid_controller, attitude_estimator = None, encoder_resolution = None, distance_samples = DISTANCE_SAMPLES):
+
+        # IMU device is only used to turn raw words into angles & rates, the very same way as on the robot
+        self.imu_device = imu_device
+
+        # By default, flight is replayed with its own estimator & encoder resolution, as read from record file's header
+        if attitude_estimator is None:
+            if configuration['attitude_estimator'] == estimator.KALMAN_FILTER:
+                attitude_estimator = estimator.KalmanFilter()
+            else:
+                attitude_estimator = estimator.ComplementaryFilter(configuration['filter_factor'], BALANCE_LOOP_TIME_STEP)
+
+        if encoder_resolution is None:
+            encoder_resolution = configuration['encoder_resolution']
+
+        self.attitude_estimator = attitude_estimator
+        self.encoder_resolution = encoder_resolution
+
+        self.balance_controller = BalanceController(speed_pid_controller, balance_pid_controller, window.MovingWindow(distance_samples), window.MovingWindow(distance_samples))
+
+        self.pitches  = array.array('d')
+        self.commands = array.array('d')
+
+    def run(self, records, warmup = WARMUP_RECORDS):
+
+        # Deterministic: time deltas are the ones recorded as actually used by controller, never taken from the clock
+        self.pitches  = array.array('d', [0.0] * len(records))
+        self.commands = array.array('d', [0.0] * len(records))
+
+        for index, record in enumerate(records):
+
+            # Record starts mid-flight: over warmup, filter & PIDs states are taken from previous record, while distance
+            # windows fill up. Once warmup is over, replay runs on its own, so that identical gains give identical outputs
+            if 0 < index < warmup:
+                self.__synchronize__(records[index - 1])
+
+            distance = (record[LEFT_TICKS_INDEX] + record[RIGHT_TICKS_INDEX]) / self.encoder_resolution / 2
+
+            self.balance_controller.update_speed(distance, record[SPEED_TIME_DELTA_INDEX], record[TARGET_SPEED_INDEX], record[EQUILIBRIUM_ANGLE_INDEX])
+
+            # No new IMU sample (sampler mode only): neither filter nor balance PID were updated. In FIFO mode, only the
+            # cycle's last sample is recorded, filtered over the whole cycle's time delta
+            if record[CONTROL_TIME_DELTA_INDEX] > 0:
+                self.imu_device.set_raw_data(record[RAW_DATA_INDEX:RAW_DATA_INDEX + RAW_DATA_WORDS])
+                self.imu_device.compute_angles()
+                self.imu_device.compute_rates ()
+
+                self.balance_controller.update_attitude(self.attitude_estimator, self.imu_device.get_pitch(), self.imu_device.get_pitch_rate(), record[CONTROL_TIME_DELTA_INDEX])
+
+            self.pitches [index] = self.balance_controller.get_filtered_pitch()
+            self.commands[index] = self.balance_controller.update_balance(record[CONTROL_TIME_DELTA_INDEX])
+
+        return self.commands
+
+    def __synchronize__(self, record):
+
+        self.attitude_estimator.reset(record[PITCH_INDEX])
+        self.balance_controller.set_state(record[PITCH_INDEX], record[BALANCE_OUTPUT_INDEX])
+
+        # Error is PID's p value, as used for next d value
+        self.balance_controller.get_speed_pid().set_i_value     (record[SPEED_I_INDEX  ])
+        self.balance_controller.get_speed_pid().set_last_error  (record[SPEED_P_INDEX  ])
+        self.balance_controller.get_balance_pid().set_i_value   (record[BALANCE_I_INDEX])
+        self.balance_controller.get_balance_pid().set_last_error(record[BALANCE_P_INDEX])
+
+    def get_pitches(self):
+        return self.pitches
+
+    def get_commands(self):
+        return self.commands
+
+    def compare(self, records, warmup = WARMUP_RECORDS):
+
+        # RMS & max differences between replayed and recorded pitches/commands, warmup excluded
+        pitch_squares   = 0.0
+        pitch_max       = 0.0
+        command_squares = 0.0
+        command_max     = 0.0
+        count           = 0
+
+        for index in range(min(warmup, len(records)), len(records)):
+
+            pitch_difference   = abs(self.pitches [index] - records[index][PITCH_INDEX         ])
+            command_difference = abs(self.commands[index] - records[index][BALANCE_OUTPUT_INDEX])
+
+            pitch_squares   += pitch_difference   ** 2
+            command_squares += command_difference ** 2
+            pitch_max        = max(pitch_max  , pitch_difference  )
+            command_max      = max(command_max, command_difference)
+            count           += 1
+
+        if count == 0:
+            return 0, 0.0, 0.0, 0.0, 0.0
+
+        return count, math.sqrt(pitch_squares / count), pitch_max, math.sqrt(command_squares / count), command_max
@@ -1 +1 @@
-from .encoder import Encoder
\ No newline at end of file
+from .encoder import Encoder, BOUNCE_TIME, X1_DECODING, X4_DECODING
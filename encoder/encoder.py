@@ -1,8 +1,15 @@
 import const
 import utils
-import RPi.GPIO
-import gpiozero
-import pigpio
+import time
+import array
+
+try:
+    import RPi.GPIO
+    import gpiozero
+    import pigpio
+except ImportError:
+    # Off the Raspberry Pi: simulation backend only
+    pass
 
 """
 Decode a rotary encoder.
@@ -22,14 +29,62 @@ Decode a rotary encoder.
 
 BOUNCE_TIME = 10
 
+# Decoding modes: 1 count per cycle (falling edges of pin 1), or 4 counts per cycle (both edges of both pins)
+X1_DECODING = 1
+X4_DECODING = 4
+
+# Step for each (previous state, new state) transition, states being (pin 1 << 1 | pin 2);
+# None flags illegal transitions, where both pins changed at once (missed edge)
+QUADRATURE_TABLE = [
+#    new: 00    01    10    11        previous:
+            0,   -1,    1, None,    #  00
+            1,    0, None,   -1,    #  01
+           -1, None,    0,    1,    #  10
+         None,    1,   -1,    0,    #  11
+]
+
+# Timestamps of the last edges, along with cumulative position reached at each of them
+EDGES_HISTORY = 16
+
+# Velocity: counted over a window at high speed, from edges period at low speed, null after a timeout
+VELOCITY_WINDOW_NS  =  20000000
+VELOCITY_MIN_EDGES  =         4
+VELOCITY_TIMEOUT_NS = 250000000
+
+# pigpio callback latency is sampled, as reading current tick costs a round trip to pigpio daemon
+LATENCY_SAMPLING = 64
+
 
 class Encoder:
 
-    def __init__(self, gpio_interface, encoder_pin_1, encoder_pin_2):
+    def __init__(self, gpio_interface, encoder_pin_1, encoder_pin_2, decoding = X1_DECODING, bounce_time = BOUNCE_TIME):
 
         self.gpio_interface = gpio_interface
         self.encoder_pin_1  = encoder_pin_1
         self.encoder_pin_2  = encoder_pin_2
+        self.bounce_time    = bounce_time
+
+        # pigpio backend has its own x1 decoding
+        if gpio_interface == const.USE_PI_GPIO:
+            self.decoding = X1_DECODING
+        else:
+            self.decoding = decoding
+
+        self.quadrature_state    = None
+        self.illegal_transitions = 0
+
+        self.counter  = 0
+        self.position = 0
+
+        # Last position handed out by take_delta(), and diagnostics
+        self.taken_position          = 0
+        self.taken_edges_count       = 0
+        self.history_overflows       = 0
+        self.max_callback_latency_ns = 0
+
+        self.edges_times     = array.array('q', [0] * EDGES_HISTORY)
+        self.edges_positions = array.array('q', [0] * EDGES_HISTORY)
+        self.edges_count     = 0
 
         if self.gpio_interface == const.USE_RPI_GPIO:
 
@@ -39,14 +94,41 @@ class Encoder:
             RPi.GPIO.setup(encoder_pin_1, RPi.GPIO.IN)
             RPi.GPIO.setup(encoder_pin_2, RPi.GPIO.IN)
 
-            RPi.GPIO.add_event_detect(encoder_pin_1, RPi.GPIO.FALLING, callback = self.callback, bouncetime = BOUNCE_TIME)
+            if self.decoding == X4_DECODING:
+
+                self.quadrature_state = (RPi.GPIO.input(encoder_pin_1) << 1) | RPi.GPIO.input(encoder_pin_2)
+
+                for encoder_pin in [encoder_pin_1, encoder_pin_2]:
+                    if bounce_time is None:
+                        RPi.GPIO.add_event_detect(encoder_pin, RPi.GPIO.BOTH, callback = self.callback_x4)
+                    else:
+                        RPi.GPIO.add_event_detect(encoder_pin, RPi.GPIO.BOTH, callback = self.callback_x4, bouncetime = bounce_time)
+
+            elif bounce_time is None:
+                RPi.GPIO.add_event_detect(encoder_pin_1, RPi.GPIO.FALLING, callback = self.callback)
+            else:
+                RPi.GPIO.add_event_detect(encoder_pin_1, RPi.GPIO.FALLING, callback = self.callback, bouncetime = bounce_time)
 
         elif self.gpio_interface == const.USE_RPI_ZERO:
 
-            self.encoder_pin_1_device = gpiozero.DigitalInputDevice(encoder_pin_1, bounce_time = BOUNCE_TIME / 1000)
-            self.encoder_pin_2_device = gpiozero.DigitalInputDevice(encoder_pin_2, bounce_time = BOUNCE_TIME / 1000)
+            if bounce_time is None:
+                bounce_time_seconds = None
+            else:
+                bounce_time_seconds = bounce_time / 1000
+
+            self.encoder_pin_1_device = gpiozero.DigitalInputDevice(encoder_pin_1, bounce_time = bounce_time_seconds)
+            self.encoder_pin_2_device = gpiozero.DigitalInputDevice(encoder_pin_2, bounce_time = bounce_time_seconds)
 
-            self.encoder_pin_1_device.when_deactivated = self.callback
+            if self.decoding == X4_DECODING:
+
+                self.quadrature_state = (self.encoder_pin_1_device.value << 1) | self.encoder_pin_2_device.value
+
+                for encoder_pin_device in [self.encoder_pin_1_device, self.encoder_pin_2_device]:
+                    encoder_pin_device.when_activated   = self.callback_x4
+                    encoder_pin_device.when_deactivated = self.callback_x4
+
+            else:
+                self.encoder_pin_1_device.when_deactivated = self.callback
 
         elif self.gpio_interface == const.USE_PI_GPIO:
 
@@ -56,6 +138,10 @@ class Encoder:
 
             self.pigpio = pigpio.pi()
 
+            # pigpio ticks are 32-bit microseconds, unwrapped into nanoseconds
+            self.last_tick = self.pigpio.get_current_tick()
+            self.tick_ns   = 0
+
             self.pigpio.set_mode(encoder_pin_1, pigpio.INPUT)
             self.pigpio.set_mode(encoder_pin_2, pigpio.INPUT)
 
@@ -65,10 +151,43 @@ class Encoder:
             self.pigpio.callback(encoder_pin_1, pigpio.EITHER_EDGE, self.callback2)
             self.pigpio.callback(encoder_pin_2, pigpio.EITHER_EDGE, self.callback2)
 
-        self.counter = 0
+        elif self.gpio_interface == const.USE_SIMULATION:
+
+            # Edges are fed through process_state(), time being driven by the simulation too
+            self.simulated_time_ns = 0
+
+    def __get_time_ns__(self):
+
+        if self.gpio_interface == const.USE_PI_GPIO:
+            return self.tick_ns + pigpio.tickDiff(self.last_tick, self.pigpio.get_current_tick()) * 1000
+        elif self.gpio_interface == const.USE_SIMULATION:
+            return self.simulated_time_ns
+        else:
+            return time.monotonic_ns()
+
+    def __record_edge__(self, step, time_ns):
+
+        self.counter  += step
+        self.position += step
+
+        index = self.edges_count % EDGES_HISTORY
+
+        self.edges_times    [index] = time_ns
+        self.edges_positions[index] = self.position
+
+        # Publish edge only once fully written
+        self.edges_count += 1
+
+    def __record_latency__(self, latency_ns):
+
+        # From edge to its processing for pigpio, from callback entry to edge recording otherwise
+        if latency_ns > self.max_callback_latency_ns:
+            self.max_callback_latency_ns = latency_ns
 
     def callback(self, channel):
 
+        time_ns = time.monotonic_ns()
+
         if self.gpio_interface == const.USE_RPI_GPIO:
 
             pin_1_state = RPi.GPIO.input(self.encoder_pin_1)
@@ -80,12 +199,53 @@ class Encoder:
             pin_2_state = self.encoder_pin_2_device.value
 
         if pin_1_state != pin_2_state:
-            self.counter += 1
+            self.__record_edge__( 1, time_ns)
+        else:
+            self.__record_edge__(-1, time_ns)
+
+        self.__record_latency__(time.monotonic_ns() - time_ns)
+
+    def process_state(self, pin_1_state, pin_2_state, time_ns):
+
+        # x4 decoding core: fed by edge callbacks, or directly by synthetic edges sequences
+        state = (pin_1_state << 1) | pin_2_state
+
+        if self.quadrature_state is None:
+            self.quadrature_state = state
+            return
+
+        step = QUADRATURE_TABLE[(self.quadrature_state << 2) | state]
+
+        self.quadrature_state = state
+
+        if step is None:
+            self.illegal_transitions += 1
+        elif step != 0:
+            self.__record_edge__(step, time_ns)
+
+    def callback_x4(self, channel = None):
+
+        time_ns = time.monotonic_ns()
+
+        if self.gpio_interface == const.USE_RPI_GPIO:
+
+            pin_1_state = RPi.GPIO.input(self.encoder_pin_1)
+            pin_2_state = RPi.GPIO.input(self.encoder_pin_2)
+
         else:
-            self.counter -= 1
+
+            pin_1_state = self.encoder_pin_1_device.value
+            pin_2_state = self.encoder_pin_2_device.value
+
+        self.process_state(pin_1_state, pin_2_state, time_ns)
+
+        self.__record_latency__(time.monotonic_ns() - time_ns)
 
     def callback2(self, gpio, level, tick):
 
+        self.tick_ns  += pigpio.tickDiff(self.last_tick, tick) * 1000
+        self.last_tick = tick
+
         if gpio == self.encoder_pin_1:
             self.level_encoder_1 = level
         else:
@@ -99,15 +259,98 @@ class Encoder:
 
 
                 if self.level_encoder_2 == 1:
-                    self.counter -= 1
+                    self.__record_edge__(-1, self.tick_ns)
 
             elif gpio == self.encoder_pin_2 and level == 1:
 
                 if self.level_encoder_1 == 1:
-                    self.counter += 1
+                    self.__record_edge__( 1, self.tick_ns)
+
+        if self.edges_count % LATENCY_SAMPLING == 0:
+            self.__record_latency__(pigpio.tickDiff(tick, self.pigpio.get_current_tick()) * 1000)
+
+    def set_simulated_time(self, time_ns):
+        self.simulated_time_ns = time_ns
 
     def get_counter(self):
         return self.counter
 
     def reset_counter(self):
-        self.counter = 0
\ No newline at end of file
+        self.counter = 0
+
+    def get_position(self):
+        return self.position
+
+    def take_delta(self):
+
+        # Cumulative position is only written by callbacks: a single read makes the snapshot atomic,
+        # and no edge can get lost between reading and resetting a counter
+        position    = self.position
+        edges_count = self.edges_count
+        time_ns     = self.__get_time_ns__()
+
+        delta               = position - self.taken_position
+        self.taken_position = position
+
+        # Edges history was overwritten before being looked at
+        if edges_count - self.taken_edges_count > EDGES_HISTORY:
+            self.history_overflows += 1
+
+        self.taken_edges_count = edges_count
+
+        return delta, time_ns
+
+    def get_history_overflows(self):
+        return self.history_overflows
+
+    def get_max_callback_latency(self):
+        return self.max_callback_latency_ns / 1000000000
+
+    def get_resolution(self):
+        return self.decoding
+
+    def get_illegal_transitions(self):
+        return self.illegal_transitions
+
+    def get_velocity(self):
+
+        # Snapshot edges history, retrying if an edge was recorded meanwhile
+        while True:
+
+            edges_count = self.edges_count
+            now_ns      = self.__get_time_ns__()
+
+            history_count = min(edges_count, EDGES_HISTORY)
+            times         = [self.edges_times    [(edges_count - 1 - i) % EDGES_HISTORY] for i in range(0, history_count)]
+            positions     = [self.edges_positions[(edges_count - 1 - i) % EDGES_HISTORY] for i in range(0, history_count)]
+
+            if self.edges_count == edges_count:
+                break
+
+        if history_count < 2 or now_ns - times[0] > VELOCITY_TIMEOUT_NS:
+            return 0.0
+
+        # High speed: count edges over the window (or over whole history, if window holds even more edges)
+        window_start_ns = now_ns - VELOCITY_WINDOW_NS
+        edges_in_window = 0
+
+        while edges_in_window < history_count and times[edges_in_window] >= window_start_ns:
+            edges_in_window += 1
+
+        if edges_in_window >= VELOCITY_MIN_EDGES:
+
+            if edges_in_window < history_count:
+                return (positions[0] - positions[edges_in_window]) * 1000000000 / VELOCITY_WINDOW_NS
+            else:
+                return (positions[0] - positions[-1]) * 1000000000 / (now_ns - times[-1])
+
+        # Low speed: period between last two edges, or time since last edge if wheel is slowing down
+        edge_period_ns = max(times[0] - times[1], now_ns - times[0], 1)
+
+        return (positions[0] - positions[1]) * 1000000000 / edge_period_ns
+
+    def print_encoder_info(self):
+        print("Position = {:8} / Illegal transitions = {:4} / History overflows = {:4} / Max callback latency = {:6.0f} us".format(self.position,
+                                                                                                                              self.illegal_transitions,
+                                                                                                                              self.history_overflows,
+                                                                                                                              self.max_callback_latency_ns / 1000))
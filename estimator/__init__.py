@@ -0,0 +1 @@
+from .estimator import ComplementaryFilter, KalmanFilter, COMPLEMENTARY_FILTER, KALMAN_FILTER
@@ -0,0 +1,117 @@
+import math
+
+# Default Kalman filter noise parameters: angle & gyroscope bias process noises, angle measurement noise
+KALMAN_Q_ANGLE   = 0.001
+KALMAN_Q_BIAS    = 0.003
+KALMAN_R_MEASURE = 0.03
+
+# Attitude estimators' types, as selected on the robot & stored into flight records
+COMPLEMENTARY_FILTER = 1
+KALMAN_FILTER        = 2
+
+
+class ComplementaryFilter:
+
+    def __init__(self, factor, nominal_time_delta):
+
+        self.nominal_time_delta = nominal_time_delta
+        self.angle              = 0.0
+
+        self.set_factor(factor)
+
+    def reset(self, angle = 0.0):
+        self.angle = angle
+
+    def set_factor(self, factor):
+
+        if not 0 <= factor <= 1:
+            raise ValueError("Complementary filter factor must be within [0, 1]: " + str(factor))
+
+        self.factor = factor
+
+        # Equivalent time constant, so that filter keeps the same behavior whatever the actual time delta.
+        # Factor 1 is pure gyroscope integration (infinite time constant)
+        if factor == 1:
+            self.time_constant = math.inf
+        else:
+            self.time_constant = factor * self.nominal_time_delta / (1 - factor)
+
+    def get_factor(self):
+        return self.factor
+
+    def get_angle(self):
+        return self.angle
+
+    def update(self, angle, rate, time_delta):
+
+        if self.time_constant == math.inf:
+            factor = 1.0
+        else:
+            factor = self.time_constant / (self.time_constant + time_delta)
+
+        self.angle = factor * (self.angle + rate * time_delta) + (1 - factor) * angle
+
+        return self.angle
+
+    def print_estimator_info(self):
+        print("Complementary filter: factor = {:6} - angle = {:6.2f}".format(self.factor, self.angle))
+
+
+class KalmanFilter:
+
+    def __init__(self, q_angle = KALMAN_Q_ANGLE, q_bias = KALMAN_Q_BIAS, r_measure = KALMAN_R_MEASURE):
+
+        self.q_angle   = q_angle
+        self.q_bias    = q_bias
+        self.r_measure = r_measure
+
+        self.reset()
+
+    def reset(self, angle = 0.0):
+
+        # State: angle & gyroscope bias, with their error covariance matrix
+        self.angle = angle
+        self.bias  = 0.0
+
+        self.p_00 = 0.0
+        self.p_01 = 0.0
+        self.p_10 = 0.0
+        self.p_11 = 0.0
+
+    def get_angle(self):
+        return self.angle
+
+    def get_bias(self):
+        return self.bias
+
+    def update(self, angle, rate, time_delta):
+
+        # Predict: integrate unbiased rate
+        self.angle += time_delta * (rate - self.bias)
+
+        self.p_00 += time_delta * (time_delta * self.p_11 - self.p_01 - self.p_10 + self.q_angle)
+        self.p_01 -= time_delta * self.p_11
+        self.p_10 -= time_delta * self.p_11
+        self.p_11 += time_delta * self.q_bias
+
+        # Correct: with angle measurement
+        s   = self.p_00 + self.r_measure
+        k_0 = self.p_00 / s
+        k_1 = self.p_10 / s
+        y   = angle - self.angle
+
+        self.angle += k_0 * y
+        self.bias  += k_1 * y
+
+        p_00 = self.p_00
+        p_01 = self.p_01
+
+        self.p_00 -= k_0 * p_00
+        self.p_01 -= k_0 * p_01
+        self.p_10 -= k_1 * p_00
+        self.p_11 -= k_1 * p_01
+
+        return self.angle
+
+    def print_estimator_info(self):
+        print("Kalman filter: Q angle = {} - Q bias = {} - R measure = {} - angle = {:6.2f} - bias = {:6.2f}".format(self.q_angle, self.q_bias, self.r_measure, self.angle, self.bias))
@@ -1 +1 @@
-from .i2c import I2cDevice
\ No newline at end of file
+from .i2c import I2cDevice
@@ -1,10 +1,20 @@
-import smbus
+try:
+    import smbus
+except ImportError:
+    # No I2C bus here: an SMBus-like object has to be provided
+    pass
 
 
 class I2cDevice:
 
     def __init__(self, bus, address):
-        self.bus     = smbus.SMBus(bus)
+
+        # Bus can either be a bus number or an already opened SMBus-like object
+        if isinstance(bus, int):
+            self.bus = smbus.SMBus(bus)
+        else:
+            self.bus = bus
+
         self.address = address
 
     def read_byte(self, register):
@@ -12,3 +22,10 @@ class I2cDevice:
 
     def write_byte(self, register, value):
         self.bus.write_byte_data(self.address, register, value)
+
+    def read_block(self, register, length):
+        # Consecutive registers read in a single transaction (SMBus limits length to 32 bytes)
+        return bytes(self.bus.read_i2c_block_data(self.address, register, length))
+
+    def write_block(self, register, data):
+        self.bus.write_i2c_block_data(self.address, register, list(data))
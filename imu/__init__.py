@@ -1 +1,2 @@
-from .imu import ImuDevice
\ No newline at end of file
+from .imu import *
+from .sampler import ImuSampler
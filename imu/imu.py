@@ -1,6 +1,15 @@
 import i2c
 import math
 import time
+import array
+import struct
+import threading
+
+# Only needed for data ready interrupt
+try:
+    import RPi.GPIO
+except ImportError:
+    pass
 
 # MPU6050 I2C bus/address
 IMU_BUS     = 0x01
@@ -8,13 +17,20 @@ IMU_ADDRESS = 0x68
 
 # MPU6050 registers
 PWR_MGMT_1   = 0x6B
+USER_CTRL    = 0x6A
 GYRO_CONFIG  = 0x18
 SMPLRT_DIV   = 0x19
 CONFIG       = 0x1A
+FIFO_EN      = 0x23
+INT_PIN_CFG  = 0x37
 INT_ENABLE   = 0x38
+INT_STATUS   = 0x3A
+FIFO_COUNTH  = 0x72
+FIFO_R_W     = 0x74
 ACCEL_XOUT_H = 0x3B
 ACCEL_YOUT_H = 0x3D
 ACCEL_ZOUT_H = 0x3F
+TEMP_OUT_H   = 0x41
 GYRO_XOUT_H  = 0x43
 GYRO_YOUT_H  = 0x45
 GYRO_ZOUT_H  = 0x47
@@ -25,13 +41,67 @@ XG_OFFSET_H  = 0x13
 YG_OFFSET_H  = 0x15
 ZG_OFFSET_H  = 0x17
 
+# FIFO_EN register bits
+XG_FIFO_EN    = 0x40
+YG_FIFO_EN    = 0x20
+ZG_FIFO_EN    = 0x10
+ACCEL_FIFO_EN = 0x08
+
+# USER_CTRL register bits
+USER_CTRL_FIFO_EN    = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+
+# INT_ENABLE/INT_STATUS registers bits
+FIFO_OFLOW_INT = 0x10
+DATA_RDY_INT   = 0x01
+
+# IMU acquisition modes
+POLLING_MODE = 0
+FIFO_MODE    = 1
+SAMPLER_MODE = 2
+
+# Gyroscope output rate with digital low pass filter enabled, and divider applied on top of it
+GYROSCOPE_OUTPUT_RATE = 1000.0
+SAMPLE_RATE_DIVIDER   = 0x04
+
 ACCELERATION_SCALE_FACTOR = 16384.0
 GYROSCOPE_SCALE_FACTOR    =   131.0
 
+TEMPERATURE_SCALE_FACTOR  =   340.0
+TEMPERATURE_OFFSET        =    36.53
+
+# ACCEL_XOUT_H to GYRO_ZOUT_H: 7 big-endian signed words (acceleration, temperature, gyroscope)
+SENSOR_DATA_LENGTH = 14
+SENSOR_DATA_FORMAT = struct.Struct('>7h')
+
+# Offset registers: acceleration ones are in +/-16g units (bit 0 reserved), gyroscope ones in +/-1000dps units
+OFFSETS_FORMAT               = struct.Struct('>3h')
+OFFSETS_LENGTH               = 6
+ACCELERATION_OFFSET_SCALE    = 8
+GYROSCOPE_OFFSET_SCALE       = 4
+ACCELERATION_OFFSET_RESERVED = 0x0001
+
+# FIFO holds acceleration then gyroscope data: 6 big-endian signed words per sample
+FIFO_SIZE          = 1024
+FIFO_SAMPLE_LENGTH = 12
+FIFO_SAMPLE_WORDS  = 6
+FIFO_SAMPLE_FORMAT = struct.Struct('>6h')
+FIFO_COUNT_FORMAT  = struct.Struct('>H')
+
+# Largest multiple of a FIFO sample fitting in an SMBus block transfer (32 bytes)
+FIFO_READ_LENGTH = 24
+FIFO_READ_FORMAT = struct.Struct('>12h')
+
+# Polling interval used to check for data ready when no interrupt pin is wired
+DATA_READY_POLLING_STEP = 0.0005
+
+# Settling time after each step of a device reset
+RESET_TIME = 1.0
+
 
 class ImuDevice:
 
-    def __init__(self):
+    def __init__(self, i2c_device = None, reset_time = RESET_TIME):
 
         self.acceleration_x = 0
         self.acceleration_y = 0
@@ -41,6 +111,8 @@ class ImuDevice:
         self.gyroscope_y = 0
         self.gyroscope_z = 0
 
+        self.temperature = 0
+
         self.acceleration_offset_x = 0
         self.acceleration_offset_y = 0
         self.acceleration_offset_z = 0
@@ -56,7 +128,18 @@ class ImuDevice:
         self.pitch_rate = 0
         self.yaw_rate   = 0
 
-        self.i2c_device = i2c.I2cDevice(IMU_BUS, IMU_ADDRESS)
+        self.sample_period       = (1 + SAMPLE_RATE_DIVIDER) / GYROSCOPE_OUTPUT_RATE
+        self.acquisition_mode    = POLLING_MODE
+        self.interrupt_pin       = None
+        self.data_ready_event    = threading.Event()
+        self.fifo_timestamp      = 0.0
+        self.fifo_overflow_count = 0
+        self.reset_time          = reset_time
+
+        if i2c_device is None:
+            self.i2c_device = i2c.I2cDevice(IMU_BUS, IMU_ADDRESS)
+        else:
+            self.i2c_device = i2c_device
 
         # Write power management register
         self.i2c_device.write_byte(PWR_MGMT_1, 0x01)
@@ -68,7 +151,7 @@ class ImuDevice:
         self.i2c_device.write_byte(GYRO_CONFIG, 0x00)
 
         # Write sample rate divider register
-        self.i2c_device.write_byte(SMPLRT_DIV, 0x04)
+        self.i2c_device.write_byte(SMPLRT_DIV, SAMPLE_RATE_DIVIDER)
 
     def __read_word__(self, register):
 
@@ -80,7 +163,7 @@ class ImuDevice:
         value = (higher_byte << 8) + lower_byte
 
         # Get signed value
-        if value > 32768:
+        if value >= 32768:
             value = value - 65536
         return value
 
@@ -102,9 +185,9 @@ class ImuDevice:
 
     def reset(self):
         self.i2c_device.write_byte(PWR_MGMT_1, 0x81)
-        time.sleep(1)
+        time.sleep(self.reset_time)
         self.i2c_device.write_byte(PWR_MGMT_1, 0x01)
-        time.sleep(1)
+        time.sleep(self.reset_time)
 
     def reset_offsets(self):
 
@@ -124,15 +207,205 @@ class ImuDevice:
         self.gyroscope_offset_y = 0
         self.gyroscope_offset_z = 0
 
+    def __write_offset_registers__(self, register, offsets):
+
+        data = OFFSETS_FORMAT.pack(*offsets)
+
+        self.i2c_device.write_block(register, data)
+
+        # Check registers were actually updated
+        if self.i2c_device.read_block(register, OFFSETS_LENGTH) != data:
+            raise IOError("IMU offset registers 0x{:02X} write verification failed".format(register))
+
+    def write_offsets(self, acceleration_offset_x, acceleration_offset_y, acceleration_offset_z, gyroscope_offset_x, gyroscope_offset_y, gyroscope_offset_z):
+
+        # Offsets are given in raw data units, with offset registers previously zeroed by reset_offsets()
+        current_registers = OFFSETS_FORMAT.unpack(self.i2c_device.read_block(XA_OFFSET_H, OFFSETS_LENGTH))
+
+        acceleration_registers = []
+        for register, offset in zip(current_registers, [acceleration_offset_x, acceleration_offset_y, acceleration_offset_z]):
+            trim = -round(offset / ACCELERATION_OFFSET_SCALE)
+            acceleration_registers.append((trim & ~ACCELERATION_OFFSET_RESERVED) | (register & ACCELERATION_OFFSET_RESERVED))
+
+        gyroscope_registers = []
+        for offset in [gyroscope_offset_x, gyroscope_offset_y, gyroscope_offset_z]:
+            gyroscope_registers.append(-round(offset / GYROSCOPE_OFFSET_SCALE))
+
+        self.__write_offset_registers__(XA_OFFSET_H, acceleration_registers)
+        self.__write_offset_registers__(XG_OFFSET_H, gyroscope_registers   )
+
+        # Keep track of offsets actually applied, after registers quantization
+        self.acceleration_offset_x = -(acceleration_registers[0] & ~ACCELERATION_OFFSET_RESERVED) * ACCELERATION_OFFSET_SCALE
+        self.acceleration_offset_y = -(acceleration_registers[1] & ~ACCELERATION_OFFSET_RESERVED) * ACCELERATION_OFFSET_SCALE
+        self.acceleration_offset_z = -(acceleration_registers[2] & ~ACCELERATION_OFFSET_RESERVED) * ACCELERATION_OFFSET_SCALE
+
+        self.gyroscope_offset_x = -gyroscope_registers[0] * GYROSCOPE_OFFSET_SCALE
+        self.gyroscope_offset_y = -gyroscope_registers[1] * GYROSCOPE_OFFSET_SCALE
+        self.gyroscope_offset_z = -gyroscope_registers[2] * GYROSCOPE_OFFSET_SCALE
+
     def read_acceleration_data(self):
-        self.acceleration_x = self.__read_word__(ACCEL_XOUT_H) - self.acceleration_offset_x
-        self.acceleration_y = self.__read_word__(ACCEL_YOUT_H) - self.acceleration_offset_y
-        self.acceleration_z = self.__read_word__(ACCEL_ZOUT_H) - self.acceleration_offset_z
+        self.acceleration_x = self.__read_word__(ACCEL_XOUT_H)
+        self.acceleration_y = self.__read_word__(ACCEL_YOUT_H)
+        self.acceleration_z = self.__read_word__(ACCEL_ZOUT_H)
 
     def read_gyroscope_data(self):
-        self.gyroscope_x = self.__read_word__(GYRO_XOUT_H) - self.gyroscope_offset_x
-        self.gyroscope_y = self.__read_word__(GYRO_YOUT_H) - self.gyroscope_offset_y
-        self.gyroscope_z = self.__read_word__(GYRO_ZOUT_H) - self.gyroscope_offset_z
+        self.gyroscope_x = self.__read_word__(GYRO_XOUT_H)
+        self.gyroscope_y = self.__read_word__(GYRO_YOUT_H)
+        self.gyroscope_z = self.__read_word__(GYRO_ZOUT_H)
+
+    def read_raw_data(self):
+        # Acceleration, temperature and gyroscope words fetched in a single block transaction
+        return SENSOR_DATA_FORMAT.unpack(self.i2c_device.read_block(ACCEL_XOUT_H, SENSOR_DATA_LENGTH))
+
+    def set_raw_data(self, raw_data):
+
+        # Offsets are applied by the IMU itself, data is used as is
+        self.acceleration_x, self.acceleration_y, self.acceleration_z, self.temperature, self.gyroscope_x, self.gyroscope_y, self.gyroscope_z = raw_data
+
+    def read_all(self):
+        self.set_raw_data(self.read_raw_data())
+
+    def get_raw_data(self):
+        return self.acceleration_x, self.acceleration_y, self.acceleration_z, self.temperature, self.gyroscope_x, self.gyroscope_y, self.gyroscope_z
+
+    def enable_fifo(self, interrupt_pin = None):
+
+        self.interrupt_pin = interrupt_pin
+
+        # Data ready interrupt: 50us active high pulse, cleared on INT_STATUS read
+        self.i2c_device.write_byte(INT_PIN_CFG, 0x00)
+        self.i2c_device.write_byte(INT_ENABLE , DATA_RDY_INT | FIFO_OFLOW_INT)
+
+        # Push acceleration and gyroscope data into the FIFO at each sample
+        self.i2c_device.write_byte(FIFO_EN, XG_FIFO_EN | YG_FIFO_EN | ZG_FIFO_EN | ACCEL_FIFO_EN)
+        self.reset_fifo()
+
+        if self.interrupt_pin is not None:
+
+            RPi.GPIO.setmode(RPi.GPIO.BCM)
+            RPi.GPIO.setwarnings(False)
+
+            RPi.GPIO.setup(self.interrupt_pin, RPi.GPIO.IN)
+
+            RPi.GPIO.add_event_detect(self.interrupt_pin, RPi.GPIO.RISING, callback = self.data_ready_callback)
+
+        self.acquisition_mode = FIFO_MODE
+
+    def disable_fifo(self):
+
+        if self.interrupt_pin is not None:
+            RPi.GPIO.remove_event_detect(self.interrupt_pin)
+            self.interrupt_pin = None
+
+        self.i2c_device.write_byte(INT_ENABLE, 0x00)
+        self.i2c_device.write_byte(FIFO_EN   , 0x00)
+        self.i2c_device.write_byte(USER_CTRL , 0x00)
+
+        self.acquisition_mode = POLLING_MODE
+
+    def reset_fifo(self):
+
+        self.i2c_device.write_byte(USER_CTRL, USER_CTRL_FIFO_RESET)
+        self.i2c_device.write_byte(USER_CTRL, USER_CTRL_FIFO_EN   )
+
+        self.fifo_timestamp = time.monotonic()
+        self.data_ready_event.clear()
+
+    def data_ready_callback(self, channel):
+        self.data_ready_event.set()
+
+    def wait_for_data_ready(self, timeout):
+
+        if self.interrupt_pin is not None:
+
+            is_data_ready = self.data_ready_event.wait(timeout)
+            self.data_ready_event.clear()
+
+            return is_data_ready
+
+        # No interrupt line: sleep until next expected sample, then poll interrupt status
+        end_time       = time.monotonic() + timeout
+        remaining_time = self.fifo_timestamp + self.sample_period - time.monotonic()
+
+        if remaining_time > 0:
+            time.sleep(min(remaining_time, timeout))
+
+        while True:
+
+            status = self.i2c_device.read_byte(INT_STATUS)
+
+            if status & FIFO_OFLOW_INT:
+                self.fifo_overflow_count += 1
+                self.reset_fifo()
+            elif status & DATA_RDY_INT:
+                return True
+
+            if time.monotonic() >= end_time:
+                return False
+
+            time.sleep(DATA_READY_POLLING_STEP)
+
+    def read_fifo_count(self):
+        return FIFO_COUNT_FORMAT.unpack(self.i2c_device.read_block(FIFO_COUNTH, 2))[0]
+
+    def read_fifo(self):
+
+        timestamps = array.array('d')
+        samples    = array.array('h')
+
+        fifo_count = self.read_fifo_count()
+        now        = time.monotonic()
+
+        # A full or misaligned FIFO has lost data: restart from a clean state
+        if fifo_count >= FIFO_SIZE or fifo_count % FIFO_SAMPLE_LENGTH != 0:
+            self.fifo_overflow_count += 1
+            self.reset_fifo()
+            return timestamps, samples
+
+        samples_count = fifo_count // FIFO_SAMPLE_LENGTH
+
+        # Drain FIFO, two samples per block transfer
+        while fifo_count >= FIFO_READ_LENGTH:
+            samples.extend(FIFO_READ_FORMAT.unpack(self.i2c_device.read_block(FIFO_R_W, FIFO_READ_LENGTH)))
+            fifo_count -= FIFO_READ_LENGTH
+
+        if fifo_count > 0:
+            samples.extend(FIFO_SAMPLE_FORMAT.unpack(self.i2c_device.read_block(FIFO_R_W, FIFO_SAMPLE_LENGTH)))
+
+        # Samples are spaced by the sensor's sample clock; resynchronize on host clock if drifting away
+        last_timestamp = self.fifo_timestamp + samples_count * self.sample_period
+
+        if abs(last_timestamp - now) > self.sample_period:
+            last_timestamp = now
+
+        for index in range(0, samples_count):
+            timestamps.append(last_timestamp - (samples_count - 1 - index) * self.sample_period)
+
+        if samples_count > 0:
+            self.fifo_timestamp = last_timestamp
+
+        return timestamps, samples
+
+    def set_fifo_sample(self, samples, index):
+
+        offset = index * FIFO_SAMPLE_WORDS
+
+        self.acceleration_x = samples[offset    ]
+        self.acceleration_y = samples[offset + 1]
+        self.acceleration_z = samples[offset + 2]
+
+        self.gyroscope_x = samples[offset + 3]
+        self.gyroscope_y = samples[offset + 4]
+        self.gyroscope_z = samples[offset + 5]
+
+    def get_acquisition_mode(self):
+        return self.acquisition_mode
+
+    def get_sample_period(self):
+        return self.sample_period
+
+    def get_fifo_overflow_count(self):
+        return self.fifo_overflow_count
 
     def get_x_acceleration(self):
         return self.acceleration_x
@@ -152,6 +425,12 @@ class ImuDevice:
     def get_z_gyroscope(self):
         return self.gyroscope_z
 
+    def get_temperature(self):
+        return self.temperature
+
+    def get_temperature_scaled(self):
+        return self.temperature / TEMPERATURE_SCALE_FACTOR + TEMPERATURE_OFFSET
+
     def get_x_acceleration_scaled(self):
         return self.acceleration_x / ACCELERATION_SCALE_FACTOR
 
@@ -182,39 +461,21 @@ class ImuDevice:
     def get_x_acceleration_offset(self):
         return self.acceleration_offset_x
 
-    def set_x_acceleration_offset(self, offset):
-        self.acceleration_offset_x = offset
-
     def get_y_acceleration_offset(self):
         return self.acceleration_offset_y
 
-    def set_y_acceleration_offset(self, offset):
-        self.acceleration_offset_y = offset
-
     def get_z_acceleration_offset(self):
         return self.acceleration_offset_z
 
-    def set_z_acceleration_offset(self, offset):
-        self.acceleration_offset_z = offset
-
     def get_x_gyroscope_offset(self):
         return self.gyroscope_offset_x
 
-    def set_x_gyroscope_offset(self, offset):
-        self.gyroscope_offset_x = offset
-
     def get_y_gyroscope_offset(self):
         return self.gyroscope_offset_y
 
-    def set_y_gyroscope_offset(self, offset):
-        self.gyroscope_offset_y = offset
-
     def get_z_gyroscope_offset(self):
         return self.gyroscope_offset_z
 
-    def set_z_gyroscope_offset(self, offset):
-        self.gyroscope_offset_z = offset
-
     def get_roll(self):
         return self.roll
 
@@ -230,14 +491,15 @@ class ImuDevice:
     def get_yaw_rate(self):
         return self.yaw_rate
 
-    def print_imu_info(self):
+    def print_imu_info(self, read = True):
 
         print("X / Y / Z acceleration offsets: {} / {} / {}".format(self.acceleration_offset_x, self.acceleration_offset_y, self.acceleration_offset_z))
         print("X / Y / Z gyroscope    offsets: {} / {} / {}".format(self.gyroscope_offset_x   , self.gyroscope_offset_y   , self.gyroscope_offset_z   ))
 
-        self.read_acceleration_data()
-        self.read_gyroscope_data   ()
-        self.compute_angles        ()
+        # When another thread owns the bus (sampler, FIFO reader), last sample it set is printed as is
+        if read == True:
+            self.read_all      ()
+            self.compute_angles()
 
         print("")
         print("X / Y / Z acceleration raw data:  {} / {} / {}".format(self.acceleration_x, self.acceleration_y, self.acceleration_z))
@@ -246,4 +508,8 @@ class ImuDevice:
         print("X / Y / Z acceleration scaled data: {:6.2f} / {:6.2f} / {:6.2f}".format(self.get_x_acceleration_scaled(), self.get_y_acceleration_scaled(), self.get_z_acceleration_scaled()))
         print("X / Y / Z gyroscope    scaled data: {:6.2f} / {:6.2f} / {:6.2f}".format(self.get_x_gyroscope_scaled()   , self.get_y_gyroscope_scaled()   , self.get_z_gyroscope_scaled()   ))
         print("")
+        print("Temperature: {:6.2f}".format(self.get_temperature_scaled()))
+        print("")
+        print("Acquisition mode: {} - FIFO overflows: {}".format("FIFO" if self.acquisition_mode == FIFO_MODE else "polling", self.fifo_overflow_count))
+        print("")
         print("Roll : {:6.2f} - Pitch: {:6.2f}".format(self.roll, self.pitch))
@@ -0,0 +1,139 @@
+import time
+import array
+import threading
+
+SAMPLE_WORDS     = 7
+DEFAULT_CAPACITY = 64
+
+
+class ImuSampler:
+
+    def __init__(self, imu_device, capacity = DEFAULT_CAPACITY):
+
+        self.imu_device    = imu_device
+        self.capacity      = capacity
+        self.sample_period = imu_device.get_sample_period()
+
+        # Ring buffer of timestamped raw samples, written by the sampler thread only
+        self.timestamps = array.array('d', [0.0] * capacity)
+        self.data       = array.array('h', [0  ] * capacity * SAMPLE_WORDS)
+
+        # Number of samples written so far: last sample index is (sequence - 1) % capacity
+        self.sequence = 0
+
+        self.overruns_count = 0
+        self.errors_count   = 0
+        self.last_error     = None
+
+        self.is_running = False
+        self.thread     = None
+
+    def start(self):
+
+        self.is_running = True
+        self.thread     = threading.Thread(target = self.sampling_thread, args = [], daemon = True)
+        self.thread.start()
+
+    def stop(self):
+
+        self.is_running = False
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def sampling_thread(self):
+
+        next_time = time.monotonic()
+
+        while self.is_running:
+
+            try:
+                raw_data = self.imu_device.read_raw_data()
+            except Exception as e:
+                self.errors_count += 1
+                self.last_error    = e
+                raw_data           = None
+
+            if raw_data is not None:
+
+                index  = self.sequence % self.capacity
+                offset = index * SAMPLE_WORDS
+
+                self.timestamps[index]                  = time.monotonic()
+                self.data[offset:offset + SAMPLE_WORDS] = array.array('h', raw_data)
+
+                # Publish sample only once fully written
+                self.sequence += 1
+
+            next_time += self.sample_period
+            now        = time.monotonic()
+
+            if now < next_time:
+                time.sleep(next_time - now)
+            else:
+                # Bus stall or scheduling delay: skip missed samples rather than bursting to catch up
+                self.overruns_count += 1
+                next_time            = now
+
+    def get_sequence(self):
+        return self.sequence
+
+    def get_latest(self):
+
+        while True:
+
+            sequence = self.sequence
+
+            if sequence == 0:
+                return None
+
+            index  = (sequence - 1) % self.capacity
+            offset = index * SAMPLE_WORDS
+
+            timestamp = self.timestamps[index]
+            raw_data  = tuple(self.data[offset:offset + SAMPLE_WORDS])
+
+            # Retry if the sampler lapped the ring buffer while reading
+            if self.sequence - sequence < self.capacity - 1:
+                return sequence, timestamp, raw_data
+
+    def get_average(self, count):
+
+        count = min(count, self.capacity - 1)
+
+        while True:
+
+            sequence = self.sequence
+
+            if sequence == 0:
+                return None
+
+            samples_count = min(count, sequence)
+            sums          = [0] * SAMPLE_WORDS
+
+            for i in range(sequence - samples_count, sequence):
+
+                offset = (i % self.capacity) * SAMPLE_WORDS
+
+                for word in range(0, SAMPLE_WORDS):
+                    sums[word] += self.data[offset + word]
+
+            timestamp = self.timestamps[(sequence - 1) % self.capacity]
+
+            # Averaged words are rounded back to integers, like the raw words they stand for
+            if self.sequence - sequence < self.capacity - samples_count:
+                return sequence, timestamp, tuple([int(round(value / samples_count)) for value in sums])
+
+    def get_overruns_count(self):
+        return self.overruns_count
+
+    def get_errors_count(self):
+        return self.errors_count
+
+    def print_sampler_info(self):
+
+        print("Sampler samples: {} - Overruns: {} - Errors: {}".format(self.sequence, self.overruns_count, self.errors_count))
+
+        if self.last_error is not None:
+            print("Sampler last error: " + str(self.last_error))
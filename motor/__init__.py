@@ -1 +1 @@
-from .motor import Motor, PWM_MIN, PWM_MAX
\ No newline at end of file
+from .motor import Motor, PWM_MIN, PWM_MAX, STOPPED, FORWARD, BACKWARD
\ No newline at end of file
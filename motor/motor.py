@@ -1,8 +1,13 @@
 import const
 import utils
-import RPi.GPIO
-import gpiozero
-import pigpio
+
+# GPIO libraries are only needed by their own backend (simulation runs without any)
+try:
+    import RPi.GPIO
+    import gpiozero
+    import pigpio
+except ImportError:
+    pass
 
 
 STOPPED  = 0
@@ -195,4 +200,12 @@ class Motor:
 
     def get_speed(self):
 
-        return self.speed
\ No newline at end of file
+        return self.speed
+
+    def get_direction(self):
+
+        return self.direction
+
+    def get_pwm_offset(self):
+
+        return self.pwm_offset
\ No newline at end of file
@@ -0,0 +1 @@
+from .odometry import Odometry
@@ -0,0 +1,94 @@
+import math
+import array
+
+# Weight of gyroscope in heading fusion: gyroscope is trusted on short term, encoders drift with wheels slip
+GYROSCOPE_WEIGHT = 0.98
+
+# Pose history: one pose every decimation updates
+HISTORY_SIZE       = 512
+HISTORY_DECIMATION = 20
+
+
+class Odometry:
+
+    def __init__(self, distance_per_tick, wheel_base, gyroscope_weight = GYROSCOPE_WEIGHT):
+
+        self.distance_per_tick = distance_per_tick
+        self.wheel_base        = wheel_base
+        self.gyroscope_weight  = gyroscope_weight
+
+        self.history_times    = array.array('d', [0.0] * HISTORY_SIZE)
+        self.history_x        = array.array('d', [0.0] * HISTORY_SIZE)
+        self.history_y        = array.array('d', [0.0] * HISTORY_SIZE)
+        self.history_headings = array.array('d', [0.0] * HISTORY_SIZE)
+
+        self.reset()
+
+    def reset(self):
+
+        # Pose in meters & radians (counterclockwise), from where the robot was at reset
+        self.x        = 0.0
+        self.y        = 0.0
+        self.heading  = 0.0
+        self.distance = 0.0
+
+        self.updates_count = 0
+        self.history_count = 0
+
+    def update(self, left_ticks, right_ticks, gyroscope_yaw_delta, timestamp):
+
+        left_distance  = left_ticks  * self.distance_per_tick
+        right_distance = right_ticks * self.distance_per_tick
+
+        distance_delta = (left_distance + right_distance) / 2
+
+        # Heading change from both wheels, fused with gyroscope's one (given in degrees)
+        encoders_heading_delta = (right_distance - left_distance) / self.wheel_base
+        heading_delta          = self.gyroscope_weight * math.radians(gyroscope_yaw_delta) + (1 - self.gyroscope_weight) * encoders_heading_delta
+
+        # Move along the mean heading over the update
+        middle_heading = self.heading + heading_delta / 2
+
+        self.x        += distance_delta * math.cos(middle_heading)
+        self.y        += distance_delta * math.sin(middle_heading)
+        self.heading  += heading_delta
+        self.distance += distance_delta
+
+        if self.updates_count % HISTORY_DECIMATION == 0:
+
+            index = self.history_count % HISTORY_SIZE
+
+            self.history_times   [index] = timestamp
+            self.history_x       [index] = self.x
+            self.history_y       [index] = self.y
+            self.history_headings[index] = self.heading
+
+            self.history_count += 1
+
+        self.updates_count += 1
+
+    def get_x(self):
+        return self.x
+
+    def get_y(self):
+        return self.y
+
+    def get_heading(self):
+        return self.heading
+
+    def get_distance(self):
+        return self.distance
+
+    def get_history(self):
+
+        # Oldest pose first
+        count = min(self.history_count, HISTORY_SIZE)
+        first = self.history_count - count
+
+        return [(self.history_times   [i % HISTORY_SIZE],
+                 self.history_x       [i % HISTORY_SIZE],
+                 self.history_y       [i % HISTORY_SIZE],
+                 self.history_headings[i % HISTORY_SIZE]) for i in range(first, self.history_count)]
+
+    def print_odometry_info(self):
+        print("X = {:6.2f} m / Y = {:6.2f} m / Heading = {:7.2f} deg / Distance = {:6.2f} m".format(self.x, self.y, math.degrees(self.heading), self.distance))
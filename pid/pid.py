@@ -45,6 +45,12 @@ class Pid:
     def set_max_value(self, max_value):
         self.max_value = max_value
 
+    def set_i_value(self, i_value):
+        self.i_value = i_value
+
+    def set_last_error(self, last_error):
+        self.last_error = last_error
+
     def set_anti_wind_up(self, anti_wind_up_factor):
         self.anti_wind_up_value = anti_wind_up_factor * max([abs(self.min_value), abs(self.max_value)])
 
@@ -69,6 +75,18 @@ class Pid:
     def get_anti_wind_up(self):
         return self.anti_wind_up_value
 
+    def get_p_value(self):
+        return self.p_value
+
+    def get_i_value(self):
+        return self.i_value
+
+    def get_d_value(self):
+        return self.d_value
+
+    def get_computed_value(self):
+        return self.computed_value
+
     def update(self, current_value, time_delta):
 
         current_error = self.target - current_value
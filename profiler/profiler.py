@@ -0,0 +1,69 @@
+import time
+import array
+
+DEFAULT_CAPACITY = 1024
+
+
+class StageProfiler:
+
+    def __init__(self, stages_names, capacity = DEFAULT_CAPACITY, enabled = True):
+
+        self.stages_names = stages_names
+        self.capacity     = capacity
+        self.enabled      = enabled
+
+        # Per stage durations (ns) of the last cycles, as a ring buffer indexed by cycle
+        self.durations = [array.array('q', [0] * capacity) for name in stages_names]
+
+        self.cycles_count = 0
+        self.index        = 0
+        self.last_time    = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def is_enabled(self):
+        return self.enabled
+
+    def reset(self):
+        self.cycles_count = 0
+        self.index        = 0
+
+    def start(self):
+        if self.enabled:
+            self.last_time = time.perf_counter_ns()
+
+    def mark(self, stage):
+        if self.enabled:
+            now = time.perf_counter_ns()
+            self.durations[stage][self.index] = now - self.last_time
+            self.last_time = now
+
+    def end_cycle(self):
+        if self.enabled:
+            self.cycles_count += 1
+            self.index         = self.cycles_count % self.capacity
+
+    def get_percentiles(self, stage, percentiles):
+
+        samples_count = min(self.cycles_count, self.capacity)
+
+        if samples_count == 0:
+            return [0] * len(percentiles)
+
+        durations = sorted(self.durations[stage][:samples_count])
+
+        return [durations[min(samples_count - 1, int(percentile * samples_count / 100))] for percentile in percentiles]
+
+    def print_profiler_info(self):
+
+        samples_count = min(self.cycles_count, self.capacity)
+
+        print("Profiler {} - last {} of {} cycles (us)".format("enabled" if self.enabled else "disabled", samples_count, self.cycles_count))
+
+        for stage in range(0, len(self.stages_names)):
+            p50, p99, p100 = self.get_percentiles(stage, [50, 99, 100])
+            print("{:<12}: p50 = {:8.1f} / p99 = {:8.1f} / max = {:8.1f}".format(self.stages_names[stage], p50 / 1000, p99 / 1000, p100 / 1000))
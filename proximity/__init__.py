@@ -1 +1,2 @@
-from .proximity import ProximitySensor
+from .proximity import ProximitySensor, MAX_DISTANCE
+from .sensor_array import ProximitySensorArray
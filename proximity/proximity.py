@@ -1,39 +1,165 @@
-import gpiozero
 import time
+import threading
+
+try:
+    import gpiozero
+except ImportError:
+    # Pins have to be given as gpiozero-like devices
+    pass
+
+# Speed of sound, in cm/s
+SPEED_OF_SOUND = 34300
+
+# Beyond maximum range, echo is considered lost: no need to wait for it any longer
+MAX_DISTANCE = 400
+ECHO_TIMEOUT = 2 * MAX_DISTANCE / SPEED_OF_SOUND + 0.005
+
+# Minimum time between two triggers, so that previous echoes die out
+RANGING_PERIOD = 0.060
+
+TRIGGER_PULSE = 0.00001
 
 
 class ProximitySensor:
 
-    def __init__(self, trigger_pin, echo_pin):
+    def __init__(self, trigger_pin, echo_pin, ranging_period = RANGING_PERIOD):
 
-        self.trigger_pin    = gpiozero.OutputDevice      (trigger_pin)
-        self.echo_pin       = gpiozero.DigitalInputDevice(echo_pin   )
+        # Pins can either be GPIO numbers or already created gpiozero-like devices
+        if isinstance(trigger_pin, int):
+            self.trigger_pin = gpiozero.OutputDevice(trigger_pin)
+        else:
+            self.trigger_pin = trigger_pin
+
+        if isinstance(echo_pin, int):
+            self.echo_pin = gpiozero.DigitalInputDevice(echo_pin)
+        else:
+            self.echo_pin = echo_pin
+
+        self.ranging_period = ranging_period
         self.round_distance = 0
 
-    def get_distance(self):
+        # Echo pulse is timestamped by edge callbacks, ranging thread just sleeps meanwhile
+        self.echo_start_ns   = None
+        self.echo_end_ns     = None
+        self.echo_received   = threading.Event()
+        self.is_echo_awaited = False
+
+        self.echo_pin.when_activated   = self.echo_start_callback
+        self.echo_pin.when_deactivated = self.echo_end_callback
+
+        # Latest measure slot: sequence is incremented on each new distance
+        self.condition          = threading.Condition()
+        self.sequence           = 0
+        self.timestamp          = 0.0
+        self.timeouts_count     = 0
+        self.out_of_range_count = 0
+
+        self.is_running = False
+        self.thread     = None
+
+    def start(self):
+
+        self.is_running = True
+        self.thread     = threading.Thread(target = self.ranging_thread, args = [], daemon = True)
+        self.thread.start()
+
+    def stop(self):
+
+        self.is_running = False
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def echo_start_callback(self):
+
+        if self.is_echo_awaited == True:
+            self.echo_start_ns = time.monotonic_ns()
+
+    def echo_end_callback(self):
 
-        pulse_start = None
-        pulse_end   = None
+        if self.is_echo_awaited == True and self.echo_start_ns is not None:
+            self.echo_end_ns     = time.monotonic_ns()
+            self.is_echo_awaited = False
+            self.echo_received.set()
 
+    def trigger(self):
+
+        self.echo_start_ns = None
+        self.echo_received.clear()
+        self.is_echo_awaited = True
 
         self.trigger_pin.on()
-        time.sleep(0.00001)
+        time.sleep(TRIGGER_PULSE)
         self.trigger_pin.off()
 
-        while self.echo_pin.is_active == False:
-            pulse_start = time.time()
+    def measure(self):
+
+        # One ranging, sleeping until echo is received or lost: returns whether a new distance was published
+        self.trigger()
+
+        if self.echo_received.wait(ECHO_TIMEOUT) == False:
+
+            # Lost echo: nothing is known, previous distance is kept and no new one is published
+            self.is_echo_awaited = False
+            self.timeouts_count += 1
+
+            return False
 
-        while self.echo_pin.is_active == True:
-            pulse_end = time.time()
+        distance = SPEED_OF_SOUND * ((self.echo_end_ns - self.echo_start_ns) / 1000000000 / 2)
 
-        if pulse_start and pulse_end:
+        # Nothing within range: path is clear, as far as the sensor can tell
+        if distance > MAX_DISTANCE:
+            self.out_of_range_count += 1
+            distance                 = MAX_DISTANCE
 
-            pulse_duration = pulse_end - pulse_start
-            distance = 34300 * (pulse_duration / 2)
+        with self.condition:
             self.round_distance = round(distance, 1)
+            self.timestamp      = time.monotonic()
+            self.sequence      += 1
+            self.condition.notify_all()
+
+        return True
+
+    def ranging_thread(self):
+
+        next_time = time.monotonic()
+
+        while self.is_running:
+
+            self.measure()
 
+            next_time += self.ranging_period
+            now        = time.monotonic()
+
+            if now < next_time:
+                time.sleep(next_time - now)
+            else:
+                next_time = now
+
+    def get_distance(self):
+
+        # Never blocks: latest measured distance
         return self.round_distance
 
+    def get_latest(self):
+
+        with self.condition:
+            return self.sequence, self.timestamp, self.round_distance
+
+    def wait_for_distance(self, last_sequence, timeout):
+
+        # Sleep until a distance newer than last one is measured, or timeout
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != last_sequence, timeout)
+            return self.sequence, self.round_distance
+
+    def get_timeouts_count(self):
+        return self.timeouts_count
+
     def print_proximity_info(self):
 
-        print("Next obstacle  @ {:6.2f} cm ".format(self.round_distance))
\ No newline at end of file
+        print("Next obstacle  @ {:6.2f} cm - Measures: {} - Timeouts: {} - Out of range: {}".format(self.round_distance,
+                                                                                                    self.sequence,
+                                                                                                    self.timeouts_count,
+                                                                                                    self.out_of_range_count))
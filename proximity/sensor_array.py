@@ -0,0 +1,107 @@
+import time
+import threading
+
+from .proximity import RANGING_PERIOD
+
+# Each sensor gets its own time slot, during which no other sensor is triggered (no crosstalk)
+SLOT_PERIOD = RANGING_PERIOD
+
+
+class ProximitySensorArray:
+
+    def __init__(self, sensors, directions, slot_period = SLOT_PERIOD):
+
+        # One direction (in degrees, 0 being forward, positive to the left) per sensor
+        self.sensors     = sensors
+        self.directions  = directions
+        self.slot_period = slot_period
+
+        # Latest distances vector, one per direction (None until measured): sequence is incremented on each new distance
+        self.condition = threading.Condition()
+        self.distances = [None] * len(sensors)
+        self.sequence  = 0
+
+        self.overruns_count = 0
+
+        self.is_running = False
+        self.thread     = None
+
+    def start(self):
+
+        self.is_running = True
+        self.thread     = threading.Thread(target = self.ranging_thread, args = [], daemon = True)
+        self.thread.start()
+
+    def stop(self):
+
+        self.is_running = False
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def ranging_thread(self):
+
+        next_time = time.monotonic()
+        index     = 0
+
+        while self.is_running:
+
+            # Staggered triggers: sensors are fired one after the other, at a fixed aggregate rate
+            sensor = self.sensors[index]
+
+            # Lost echo: previous distance in this direction is not published again
+            if sensor.measure() == True:
+                with self.condition:
+                    self.distances[index] = sensor.get_distance()
+                    self.sequence        += 1
+                    self.condition.notify_all()
+
+            index = (index + 1) % len(self.sensors)
+
+            next_time += self.slot_period
+            now        = time.monotonic()
+
+            if now < next_time:
+                time.sleep(next_time - now)
+            else:
+                self.overruns_count += 1
+                next_time            = now
+
+    def get_distances(self):
+
+        # Never blocks: copy of latest distances vector
+        with self.condition:
+            return self.sequence, list(self.distances)
+
+    def get_sensor(self, direction):
+        return self.sensors[self.directions.index(direction)]
+
+    def get_distance(self, direction):
+
+        # Latest distance in given direction, None if unknown (no sensor looks that way, or no echo yet)
+        if direction not in self.directions:
+            return None
+
+        return self.distances[self.directions.index(direction)]
+
+    def wait_for_distances(self, last_sequence, timeout):
+
+        # Sleep until distances newer than last ones are measured, or timeout
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != last_sequence, timeout)
+            return self.sequence, list(self.distances)
+
+    def get_directions(self):
+        return self.directions
+
+    def get_overruns_count(self):
+        return self.overruns_count
+
+    def print_proximity_info(self):
+
+        for direction, sensor in zip(self.directions, self.sensors):
+            print("Direction {:4} deg: ".format(direction), end = '')
+            sensor.print_proximity_info()
+
+        print("Published distances: {} - Slot overruns: {}".format(self.sequence, self.overruns_count))
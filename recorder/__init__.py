@@ -0,0 +1 @@
+from .recorder import FlightRecorder, RECORD_FIELDS, CONFIGURATION_FIELDS, MOTORS_ON_FLAG, read_records, make_file_name
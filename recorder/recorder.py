@@ -0,0 +1,134 @@
+import os
+import time
+import struct
+import threading
+
+# One record per balance loop iteration, in double precision so that a replay can reproduce it exactly:
+#   timestamp, speed & balance time deltas (as actually used by controller),
+#   raw IMU words (acceleration x/y/z, temperature, gyroscope x/y/z),
+#   filtered pitch, target angle,
+#   speed PID p/i/d/output, balance PID p/i/d/output,
+#   left/right encoder deltas,
+#   left/right motor commands,
+#   target speed, equilibrium angle,
+#   flags (bit 0: motors on)
+RECORD_FORMAT = '<d2d7h2d8d2i2d2dB'
+RECORD_STRUCT = struct.Struct(RECORD_FORMAT)
+
+RECORD_FIELDS = ['time', 'speed_time_delta', 'control_time_delta',
+                 'acceleration_x', 'acceleration_y', 'acceleration_z', 'temperature', 'gyroscope_x', 'gyroscope_y', 'gyroscope_z',
+                 'pitch', 'target_angle',
+                 'speed_p', 'speed_i', 'speed_d', 'speed_output', 'balance_p', 'balance_i', 'balance_d', 'balance_output',
+                 'left_ticks', 'right_ticks',
+                 'left_command', 'right_command',
+                 'target_speed', 'equilibrium_angle',
+                 'flags']
+
+MOTORS_ON_FLAG = 0x01
+
+# File header: magic, version, record format, records count,
+# then flight's configuration: encoder resolution (counts per cycle), attitude estimator type, complementary filter factor
+FILE_MAGIC         = b'FREC'
+FILE_VERSION       = 3
+FILE_HEADER_STRUCT = struct.Struct('<4sH32sIBBd')
+
+CONFIGURATION_FIELDS = ['encoder_resolution', 'attitude_estimator', 'filter_factor']
+
+DEFAULT_CAPACITY = 2000
+
+
+class FlightRecorder:
+
+    def __init__(self, encoder_resolution, attitude_estimator, filter_factor, capacity = DEFAULT_CAPACITY):
+
+        self.capacity = capacity
+
+        # Preallocated ring buffer of packed records, written by the control thread only
+        self.buffer = bytearray(capacity * RECORD_STRUCT.size)
+
+        # Number of records written so far: last record index is (sequence - 1) % capacity
+        self.sequence = 0
+
+        self.dumps_count = 0
+        self.last_dump   = None
+
+        # Stored into files' header, for replays to run the same way as the flight
+        self.set_configuration(encoder_resolution, attitude_estimator, filter_factor)
+
+    def record(self, *values):
+
+        RECORD_STRUCT.pack_into(self.buffer, (self.sequence % self.capacity) * RECORD_STRUCT.size, *values)
+
+        self.sequence += 1
+
+    def set_configuration(self, encoder_resolution, attitude_estimator, filter_factor):
+
+        # Set as a whole: a dump never gets a half updated configuration
+        self.configuration = (encoder_resolution, attitude_estimator, filter_factor)
+
+    def get_sequence(self):
+        return self.sequence
+
+    def snapshot(self, count = None):
+
+        # Last records, oldest first: a plain memory copy, cheap enough for the control thread
+        sequence     = self.sequence
+        record_count = min(sequence, self.capacity) if count is None else min(count, sequence, self.capacity)
+        first_index  = (sequence - record_count) % self.capacity
+        last_index   = first_index + record_count
+
+        if last_index <= self.capacity:
+            data = bytes(self.buffer[first_index * RECORD_STRUCT.size:last_index * RECORD_STRUCT.size])
+        else:
+            data = bytes(self.buffer[first_index * RECORD_STRUCT.size:]) + bytes(self.buffer[:(last_index - self.capacity) * RECORD_STRUCT.size])
+
+        return record_count, data
+
+    def dump(self, file_name, count = None):
+
+        # Copy is taken right away, file being written by a background thread
+        record_count, data = self.snapshot(count)
+
+        self.dumps_count += 1
+        self.last_dump    = file_name
+
+        thread = threading.Thread(target = write_records, args = [file_name, record_count, data, self.configuration], daemon = True)
+        thread.start()
+
+        return thread
+
+    def print_recorder_info(self):
+        print("Flight recorder: {} records of {} bytes - Dumps: {} - Last dump: {}".format(self.sequence, RECORD_STRUCT.size, self.dumps_count, self.last_dump))
+
+
+def write_records(file_name, record_count, data, configuration):
+
+    directory = os.path.dirname(file_name)
+
+    if directory != '':
+        os.makedirs(directory, exist_ok = True)
+
+    with open(file_name, 'wb') as records_file:
+        records_file.write(FILE_HEADER_STRUCT.pack(FILE_MAGIC, FILE_VERSION, RECORD_FORMAT.encode('ascii'), record_count, *configuration))
+        records_file.write(data)
+
+
+def read_records(file_name):
+
+    with open(file_name, 'rb') as records_file:
+        data = records_file.read()
+
+    magic, version, record_format, record_count, *configuration = FILE_HEADER_STRUCT.unpack_from(data, 0)
+
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise IOError("Not a flight recorder file: " + file_name)
+
+    record_struct = struct.Struct(record_format.rstrip(b'\0').decode('ascii'))
+
+    records = [record_struct.unpack_from(data, FILE_HEADER_STRUCT.size + i * record_struct.size) for i in range(0, record_count)]
+
+    return dict(zip(CONFIGURATION_FIELDS, configuration)), records
+
+
+def make_file_name(directory, reason):
+    return os.path.join(directory, time.strftime('%Y%m%d_%H%M%S') + '_' + reason + '.rec')
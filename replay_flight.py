@@ -0,0 +1,89 @@
+import argparse
+import i2c
+import imu
+import estimator
+import recorder
+import controller
+import simulation
+
+# Attitude estimators, by name
+FILTERS = {'complementary': estimator.COMPLEMENTARY_FILTER,
+           'kalman'       : estimator.KALMAN_FILTER       }
+
+
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description = "Replay a flight record through balance controller, with given gains & filter")
+
+    parser.add_argument('record_file')
+    parser.add_argument('--speed-kp'  , type = float, default = controller.SPEED_PID_KP  )
+    parser.add_argument('--speed-ki'  , type = float, default = controller.SPEED_PID_KI  )
+    parser.add_argument('--speed-kd'  , type = float, default = controller.SPEED_PID_KD  )
+    parser.add_argument('--balance-kp', type = float, default = controller.BALANCE_PID_KP)
+    parser.add_argument('--balance-ki', type = float, default = controller.BALANCE_PID_KI)
+    parser.add_argument('--balance-kd', type = float, default = controller.BALANCE_PID_KD)
+    parser.add_argument('--filter'    , choices = list(FILTERS), help = "attitude estimator, flight's own one by default")
+    parser.add_argument('--factor'    , type = float, help = "complementary filter factor, flight's own one by default")
+    parser.add_argument('--resolution', type = int  , help = "encoder counts per cycle, flight's own one by default")
+    parser.add_argument('--warmup'    , type = int  , default = controller.WARMUP_RECORDS)
+    parser.add_argument('--csv'       , help = "file to write recorded & replayed pitches/commands into")
+
+    return parser.parse_args()
+
+
+def main():
+
+    arguments = parse_arguments()
+
+    configuration, records = recorder.read_records(arguments.record_file)
+
+    # Flight is replayed as it was run, unless told otherwise
+    if arguments.filter is not None:
+        configuration['attitude_estimator'] = FILTERS[arguments.filter]
+    if arguments.factor is not None:
+        configuration['filter_factor'] = arguments.factor
+    if arguments.resolution is not None:
+        configuration['encoder_resolution'] = arguments.resolution
+
+    # Raw words are fed as is: no real IMU needed
+    imu_device = imu.ImuDevice(i2c.I2cDevice(simulation.FakeMpu6050(), imu.IMU_ADDRESS))
+
+    replay = controller.Replay(imu_device,
+                               configuration,
+                               controller.make_speed_pid  (arguments.speed_kp  , arguments.speed_ki  , arguments.speed_kd  ),
+                               controller.make_balance_pid(arguments.balance_kp, arguments.balance_ki, arguments.balance_kd))
+
+    replay.run(records, arguments.warmup)
+
+    count, pitch_rms, pitch_max, command_rms, command_max = replay.compare(records, arguments.warmup)
+
+    duration = records[-1][controller.replay.TIME_INDEX] - records[0][controller.replay.TIME_INDEX] if len(records) > 1 else 0.0
+
+    print("")
+    print("Encoder resolution = {} - Attitude estimator = {} - Filter factor = {}".format(configuration['encoder_resolution'],
+                                                                                          [name for name in FILTERS if FILTERS[name] == configuration['attitude_estimator']][0],
+                                                                                          configuration['filter_factor']))
+    print("Replayed {} records ({:.1f} s of flight), {} compared after warmup".format(len(records), duration, count))
+    print("Pitch   difference: RMS = {:7.3f} deg / Max = {:7.3f} deg".format(pitch_rms  , pitch_max  ))
+    print("Command difference: RMS = {:7.3f}     / Max = {:7.3f}".format    (command_rms, command_max))
+    print("")
+
+    if arguments.csv is not None:
+
+        with open(arguments.csv, 'w') as csv_file:
+
+            csv_file.write("time,recorded_pitch,replayed_pitch,recorded_command,replayed_command\n")
+
+            for index, record in enumerate(records):
+                csv_file.write("{},{},{},{},{}\n".format(record[controller.replay.TIME_INDEX          ], record[controller.replay.PITCH_INDEX], replay.get_pitches ()[index],
+                                                         record[controller.replay.BALANCE_OUTPUT_INDEX], replay.get_commands()[index]))
+
+
+if __name__ == '__main__':
+
+    try:
+
+        main()
+
+    except KeyboardInterrupt:
+        print("Keyboard interrupt...")
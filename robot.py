@@ -1,47 +1,47 @@
 import os
+import math
 import json
-import queue
 import const
 import utils
 import imu
 import motor
 import encoder
 import proximity
-import pid
+import estimator
+import scheduler
+import profiler
+import window
+import odometry
+import telemetry
+import recorder
+import controller
 import time
-import RPi.GPIO
-import bluetooth
-import picamera
 import streamer
 import threading
 
+# Hardware-only modules: without them (e.g. in simulation), balance control logic can still be imported
+try:
+    import RPi.GPIO
+    import bluetooth
+    import picamera
+except ImportError:
+    pass
+
 SETUP_FILE             = 'setup.json'
-BALANCE_LOOP_TIME_STEP = 0.005
+BALANCE_LOOP_TIME_STEP = controller.BALANCE_LOOP_TIME_STEP
+
+# Measured time deltas are kept within sane bounds, whatever happens (first sample, stall, clock glitch...)
+MIN_TIME_DELTA = controller.MIN_TIME_DELTA
+MAX_TIME_DELTA = controller.MAX_TIME_DELTA
 
-TARGET_SPEED_STEP =   85
+TARGET_SPEED_STEP  = controller.TARGET_SPEED_STEP
 TURNING_SPEED_STEP =  25
 TURNING_ANGLE_STEP =  90
 OBSTACLE_DISTANCE  =  30
 SHUTDOWN_PITCH     =  30
-DISTANCE_SAMPLES   = 100
-
-# Default constants used by the speed PID controller
-SPEED_PID_KP     = 0.020
-SPEED_PID_KI     = 0.100
-SPEED_PID_KD     = 0.000
-SPEED_PID_TARGET = 0.000
-SPEED_PID_MIN    = -TARGET_SPEED_STEP * 2
-SPEED_PID_MAX    =  TARGET_SPEED_STEP * 2
-SPEED_PID_WINDUP = 0.025
-
-# Default constants used by the balance PID controller
-BALANCE_PID_KP     =  20.00
-BALANCE_PID_KI     = 100.00
-BALANCE_PID_KD     =   0.25
-BALANCE_PID_TARGET =  -2.50
-BALANCE_PID_MIN    =  -motor.PWM_MAX
-BALANCE_PID_MAX    =   motor.PWM_MAX
-BALANCE_PID_WINDUP =  0.05
+DISTANCE_SAMPLES   = controller.DISTANCE_SAMPLES
+
+# Default PID controllers' constants are shared with replay & simulation tools, in controller module
 
 LEFT_MOTOR_ENABLE = 16
 LEFT_MOTOR_PIN_1  = 20
@@ -57,33 +57,97 @@ LEFT_MOTOR_ENCODER_PIN_2 = 23
 RIGHT_MOTOR_ENCODER_PIN_1 = 18
 RIGHT_MOTOR_ENCODER_PIN_2 = 17
 
+# Encoders are decoded x1, debounced. Opt-in for encoders with clean edges (optical, Hall effect):
+# X4_DECODING with no debounce (None), for 4 times finer speeds
+ENCODER_DECODING    = encoder.X1_DECODING
+ENCODER_BOUNCE_TIME = encoder.BOUNCE_TIME
+
+# Robot geometry, for odometry (in meters)
+WHEEL_DIAMETER                = 0.065
+WHEEL_BASE                    = 0.170
+ENCODER_CYCLES_PER_REVOLUTION = 330
+
+# Distance-based moves, bounded in time in case wheels slip or robot is blocked
+STUCK_BACKWARD_DISTANCE = 0.20
+MOVE_TIMEOUT            = 3.0
+
 PROXIMITY_SENSOR_TRIGGER_PIN = 12
 PROXIMITY_SENSOR_ECHO_PIN    =  6
+PROXIMITY_TIMEOUT            = 1.0
+PROXIMITY_SAMPLES            =  5
+
+# Proximity sensors as (trigger pin, echo pin, direction in degrees, 0 being forward, positive to the left):
+# side sensors, if any, are used to turn to the clearest side
+PROXIMITY_SENSORS        = [(PROXIMITY_SENSOR_TRIGGER_PIN, PROXIMITY_SENSOR_ECHO_PIN, 0)]
+PROXIMITY_SIDE_DIRECTION = 45
+
+# Balance loop stages, individually timed by the profiler
+STAGE_ENCODERS    = 0
+STAGE_SPEED_PID   = 1
+STAGE_IMU         = 2
+STAGE_ESTIMATOR   = 3
+STAGE_BALANCE_PID = 4
+STAGE_MOTORS      = 5
+STAGES_NAMES      = ['Encoders', 'Speed PID', 'IMU', 'Estimator', 'Balance PID', 'Motors']
+
+# Balance loop state recorded on each cycle, and streamed to telemetry clients (http://robot:8000/telemetry?rate=10)
+TELEMETRY_FIELDS = ['time', 'pitch', 'target_angle', 'balance_p', 'balance_i', 'balance_d', 'balance_output',
+                    'speed', 'target_speed', 'left_ticks', 'right_ticks', 'yaw', 'x', 'y', 'heading']
+
+# Flight recorder keeps the last seconds of balance loop iterations, dumped on a fall or on request
+FLIGHT_RECORDER_DURATION = 10.0
+FLIGHT_RECORDS_DIRECTORY = 'flight_records'
+FALL_RECOVERY_PITCH      = SHUTDOWN_PITCH - 10
+
+# Speed estimations, selectable from debug console: encoder counts averaged over distance samples,
+# or low-lag velocity from encoder edges timestamps
+WINDOW_SPEED_ESTIMATION  = 0
+ENCODER_SPEED_ESTIMATION = 1
+
+# Attitude estimators, selectable from debug console
+COMPLEMENTARY_FILTER = estimator.COMPLEMENTARY_FILTER
+KALMAN_FILTER        = estimator.KALMAN_FILTER
+
+# IMU acquisition: polled on the loop's timer, drained from the FIFO paced by data ready interrupt,
+# or taken from the sampler thread (latest sample, or average of the last decimation ones)
+IMU_ACQUISITION_MODE   = imu.POLLING_MODE
+IMU_INTERRUPT_PIN      = 4
+IMU_SAMPLER_DECIMATION = 1
+
+# Pitch is frozen without fresh IMU data: motors are stopped once latest sample gets older than this (in seconds)
+IMU_MAX_DATA_AGE = BALANCE_LOOP_TIME_STEP * 4
+
+# Same for FIFO mode, after this many consecutive cycles without any sample (FIFO or data ready interrupt silent)
+IMU_MAX_EMPTY_READS = 4
 
 debug_mode                  = True
 are_motors_on               = False
 is_camera_on                = False
 is_camera_recording         = False
 is_obstacles_avoidance_on   = False
-complementary_filter_factor = 0.998
-distance_readings           = []
+complementary_filter_factor = controller.COMPLEMENTARY_FILTER_FACTOR
+attitude_estimator_type     = COMPLEMENTARY_FILTER
+speed_estimation_type       = WINDOW_SPEED_ESTIMATION
+distance_window             = window.MovingWindow(DISTANCE_SAMPLES)
+time_window                 = window.MovingWindow(DISTANCE_SAMPLES)
 distance_samples            = DISTANCE_SAMPLES
-equilibrium_angle           = BALANCE_PID_TARGET
+equilibrium_angle           = controller.BALANCE_PID_TARGET
 equilibrium_limit           = 0.1
 filtered_pitch              = 0.0
 relative_yaw_angle          = 0.0
-target_speed                = SPEED_PID_TARGET
+target_speed                = controller.SPEED_PID_TARGET
 turn_angle_order            = 0.0
 turn_speed_step             = 0.0
 left_counter                = 0
 right_counter               = 0
 
 
-def balance_control_thread(imu_device, speed_pid_controller, balance_pid_controller):
+def balance_control_thread(imu_device, imu_sampler, left_motor, right_motor, left_encoder, right_encoder, robot_odometry, attitude_estimators, balance_scheduler, balance_profiler, telemetry_buffer, flight_recorder, balance_controller, speed_pid_controller, balance_pid_controller):
 
     global debug_mode
     global complementary_filter_factor
-    global distance_readings
+    global attitude_estimator_type
+    global speed_estimation_type
     global distance_samples
     global equilibrium_angle
     global equilibrium_limit
@@ -98,81 +162,155 @@ def balance_control_thread(imu_device, speed_pid_controller, balance_pid_control
     with open(SETUP_FILE, 'r') as json_file:
         setup_data = json.load(json_file)
 
-    # Setup motors with their dedicated GPIOs and offsets
-    left_motor  = motor.Motor(const.USE_RPI_GPIO, LEFT_MOTOR_ENABLE , LEFT_MOTOR_PIN_1 , LEFT_MOTOR_PIN_2 , setup_data['LEFT_MOTOR_OFFSET' ])
-    right_motor = motor.Motor(const.USE_RPI_GPIO, RIGHT_MOTOR_ENABLE, RIGHT_MOTOR_PIN_1, RIGHT_MOTOR_PIN_2, setup_data['RIGHT_MOTOR_OFFSET'])
-
-    # Setup left/right motors encoders with their dedicated GPIOs
-    left_encoder  = encoder.Encoder(const.USE_RPI_GPIO, LEFT_MOTOR_ENCODER_PIN_1 , LEFT_MOTOR_ENCODER_PIN_2 )
-    right_encoder = encoder.Encoder(const.USE_RPI_GPIO, RIGHT_MOTOR_ENCODER_PIN_1, RIGHT_MOTOR_ENCODER_PIN_2)
-
     # Setup IMU
     imu_device.reset        ()
     imu_device.reset_offsets()
 
-    # Setup acceleration offsets
-    imu_device.set_x_acceleration_offset(setup_data['ACCELERATION_X_OFFSET'])
-    imu_device.set_y_acceleration_offset(setup_data['ACCELERATION_Y_OFFSET'])
-    imu_device.set_z_acceleration_offset(setup_data['ACCELERATION_Z_OFFSET'])
+    # Setup acceleration & gyroscope offsets, into IMU's hardware offset registers
+    imu_device.write_offsets(setup_data['ACCELERATION_X_OFFSET'], setup_data['ACCELERATION_Y_OFFSET'], setup_data['ACCELERATION_Z_OFFSET'],
+                             setup_data['GYROSCOPE_X_OFFSET'   ], setup_data['GYROSCOPE_Y_OFFSET'   ], setup_data['GYROSCOPE_Z_OFFSET'   ])
+
+    if IMU_ACQUISITION_MODE == imu.FIFO_MODE:
+        imu_device.enable_fifo(IMU_INTERRUPT_PIN)
+    elif IMU_ACQUISITION_MODE == imu.SAMPLER_MODE:
+        imu_sampler.start()
 
-    # Setup gyroscope offsets
-    imu_device.set_x_gyroscope_offset(setup_data['GYROSCOPE_X_OFFSET'])
-    imu_device.set_y_gyroscope_offset(setup_data['GYROSCOPE_Y_OFFSET'])
-    imu_device.set_z_gyroscope_offset(setup_data['GYROSCOPE_Z_OFFSET'])
+    last_imu_timestamp = None
+    last_imu_sequence  = 0
+    last_encoder_time  = left_encoder.take_delta()[1]
+    balance_pid_speed  = 0.0
+    has_fallen         = False
+    recorder_errors    = 0
+    imu_data_is_stale  = False
+    empty_imu_reads    = 0
+
+    balance_scheduler.start()
 
     while True:
 
-        start_time = time.time()
+        balance_profiler.start()
 
         # ######################### #
         # Speed control computation #
         # ######################### #
 
-        speed_pid_controller.set_target(target_speed)
+        # Ticks since previous loop, atomically taken: no edge gets lost
+        left_counter , encoder_time = left_encoder.take_delta ()
+        right_counter, _            = right_encoder.take_delta()
+
+        balance_profiler.mark(STAGE_ENCODERS)
+
+        # Actual time over which encoders counted
+        encoder_time_delta = utils.clamp((encoder_time - last_encoder_time) / 1000000000, MIN_TIME_DELTA, MAX_TIME_DELTA)
+        last_encoder_time  = encoder_time
 
-        left_counter  = left_encoder.get_counter()
-        right_counter = right_encoder.get_counter()
+        # Distance samples count may have been changed from console: applied here, between two appends
+        balance_controller.set_distance_samples(distance_samples)
 
-        distance_readings.append((left_counter + right_counter) / 2)
+        # Speeds are expressed in encoder cycles, whatever the decoding resolution
+        distance = (left_counter / left_encoder.get_resolution() + right_counter / right_encoder.get_resolution()) / 2
 
-        if len(distance_readings) > distance_samples:
-            distance_readings.pop(0)
-            current_speed = sum(distance_readings) / (distance_samples * BALANCE_LOOP_TIME_STEP)
+        if speed_estimation_type == ENCODER_SPEED_ESTIMATION:
+            measured_speed = (left_encoder.get_velocity() / left_encoder.get_resolution() + right_encoder.get_velocity() / right_encoder.get_resolution()) / 2
         else:
-            current_speed = target_speed
+            measured_speed = None
 
-        target_angle = equilibrium_angle + speed_pid_controller.update(current_speed, distance_samples * BALANCE_LOOP_TIME_STEP)
+        target_angle  = balance_controller.update_speed(distance, encoder_time_delta, target_speed, equilibrium_angle, measured_speed)
+        current_speed = balance_controller.get_current_speed()
 
-        left_encoder.reset_counter ()
-        right_encoder.reset_counter()
+        balance_profiler.mark(STAGE_SPEED_PID)
 
         # ########################### #
         # Balance control computation #
         # ########################### #
 
-        balance_pid_controller.set_target(target_angle)
-
         try:
-            imu_device.read_acceleration_data()
-            imu_device.read_gyroscope_data   ()
+            if IMU_ACQUISITION_MODE == imu.FIFO_MODE:
+                imu_timestamps, imu_samples = imu_device.read_fifo()
+                samples_count = len(imu_timestamps)
+                empty_imu_reads = empty_imu_reads + 1 if samples_count == 0 else 0
+                if empty_imu_reads == IMU_MAX_EMPTY_READS and debug_mode == True:
+                    print("No IMU sample from FIFO: stopping motors")
+                imu_data_is_stale = empty_imu_reads >= IMU_MAX_EMPTY_READS
+            elif IMU_ACQUISITION_MODE == imu.SAMPLER_MODE:
+                # Never blocks on I2C: bus errors & stalls are dealt with by the sampler thread
+                if IMU_SAMPLER_DECIMATION > 1:
+                    imu_sample = imu_sampler.get_average(IMU_SAMPLER_DECIMATION)
+                else:
+                    imu_sample = imu_sampler.get_latest()
+                if imu_sample is None or imu_sample[0] == last_imu_sequence:
+                    samples_count = 0
+                else:
+                    last_imu_sequence, imu_timestamp, imu_raw_data = imu_sample
+                    imu_device.set_raw_data(imu_raw_data)
+                    samples_count = 1
+                # Sequence stops advancing on persistent bus errors or stalls: latest sample just gets older
+                is_stale = imu_sample is None or time.monotonic() - imu_sample[1] > IMU_MAX_DATA_AGE
+                if is_stale == True and imu_data_is_stale == False and last_imu_sequence > 0 and debug_mode == True:
+                    print("No fresh IMU sample: stopping motors")
+                imu_data_is_stale = is_stale
+            else:
+                imu_device.read_all()
+                imu_timestamp   = balance_scheduler.now()
+                samples_count   = 1
+                empty_imu_reads = 0
         except Exception as e:
             if debug_mode == True:
                 print("IMU/I2C error detected")
                 print("Error: " + str(e))
                 print("Retrying!...")
+            # Failing bus gives no fresh data either: motors can't be left running on last command
+            empty_imu_reads += 1
+            if empty_imu_reads >= IMU_MAX_EMPTY_READS:
+                left_motor.stop ()
+                right_motor.stop()
+            # Do not spin on a failing bus
+            balance_scheduler.wait()
             continue
 
-        imu_device.compute_angles()
-        imu_device.compute_rates ()
+        balance_profiler.mark(STAGE_IMU)
+
+        control_time_delta = 0.0
+        yaw_angle_delta    = 0.0
+
+        # Run filter over each sample, so that none is missed nor used twice in FIFO mode
+        for sample_index in range(0, samples_count):
+
+            if IMU_ACQUISITION_MODE == imu.FIFO_MODE:
+                imu_device.set_fifo_sample(imu_samples, sample_index)
+                imu_timestamp = imu_timestamps[sample_index]
+
+            # Actual time between samples, falling back to nominal one for the very first sample
+            if last_imu_timestamp is None:
+                imu_time_delta = BALANCE_LOOP_TIME_STEP
+            else:
+                imu_time_delta = utils.clamp(imu_timestamp - last_imu_timestamp, MIN_TIME_DELTA, MAX_TIME_DELTA)
+
+            last_imu_timestamp  = imu_timestamp
+            control_time_delta += imu_time_delta
+
+            imu_device.compute_angles()
+            imu_device.compute_rates ()
+
+            pitch      = imu_device.get_pitch     ()
+            pitch_rate = imu_device.get_pitch_rate()
+            yaw_rate   = imu_device.get_yaw_rate  ()
 
-        pitch      = imu_device.get_pitch     ()
-        pitch_rate = imu_device.get_pitch_rate()
-        yaw_rate   = imu_device.get_yaw_rate  ()
+            filtered_pitch = balance_controller.update_attitude(attitude_estimators[attitude_estimator_type], pitch, pitch_rate, imu_time_delta)
 
-        filtered_pitch    = complementary_filter_factor * (filtered_pitch + pitch_rate * BALANCE_LOOP_TIME_STEP) + (1 - complementary_filter_factor) * pitch
-        balance_pid_speed = balance_pid_controller.update(filtered_pitch, BALANCE_LOOP_TIME_STEP)
+            yaw_angle_delta += yaw_rate * imu_time_delta
 
-        relative_yaw_angle += yaw_rate * BALANCE_LOOP_TIME_STEP
+        relative_yaw_angle += yaw_angle_delta
+
+        # Pose from this cycle's wheels ticks, heading being fused with gyroscope
+        robot_odometry.update(left_counter, right_counter, yaw_angle_delta, encoder_time / 1000000000)
+
+        balance_profiler.mark(STAGE_ESTIMATOR)
+
+        # No new IMU sample (sampler mode only): previous balance command is kept
+        balance_pid_speed = balance_controller.update_balance(control_time_delta)
+
+        balance_profiler.mark(STAGE_BALANCE_PID)
 
         # ########################### #
         # Left/right turn computation #
@@ -202,11 +340,15 @@ def balance_control_thread(imu_device, speed_pid_controller, balance_pid_control
             or ((overall_left_speed == 0) and (overall_right_speed == 0)) \
             or (target_angle - equilibrium_limit <= filtered_pitch <= target_angle + equilibrium_limit) \
             or (filtered_pitch <= -SHUTDOWN_PITCH) \
-            or (filtered_pitch >= SHUTDOWN_PITCH):
+            or (filtered_pitch >= SHUTDOWN_PITCH) \
+            or (imu_data_is_stale == True):
 
             left_motor.stop ()
             right_motor.stop()
 
+            left_command  = 0.0
+            right_command = 0.0
+
         else:
 
             if overall_left_speed > 0:
@@ -219,17 +361,117 @@ def balance_control_thread(imu_device, speed_pid_controller, balance_pid_control
             else:
                 right_motor.backward(-overall_right_speed)
 
-        end_time = time.time()
+            left_command  = overall_left_speed
+            right_command = overall_right_speed
+
+        balance_profiler.mark     (STAGE_MOTORS)
+        balance_profiler.end_cycle()
+
+        # A few microseconds: packed into flight recorder's preallocated ring buffer. Recording is best effort,
+        # and must never stop balance control
+        try:
+            flight_recorder.record(balance_scheduler.now(), encoder_time_delta, control_time_delta, *imu_device.get_raw_data(), filtered_pitch, target_angle,
+                                   speed_pid_controller.get_p_value  (), speed_pid_controller.get_i_value  (), speed_pid_controller.get_d_value  (), speed_pid_controller.get_computed_value  (),
+                                   balance_pid_controller.get_p_value(), balance_pid_controller.get_i_value(), balance_pid_controller.get_d_value(), balance_pid_controller.get_computed_value(),
+                                   left_counter, right_counter, left_command, right_command, target_speed, equilibrium_angle, recorder.MOTORS_ON_FLAG if are_motors_on == True else 0)
+        except Exception as e:
+            recorder_errors += 1
+            if debug_mode == True and recorder_errors == 1:
+                print("Flight recorder error: " + str(e))
+
+        # On a fall, dump what led to it (file being written in background)
+        if has_fallen == False and are_motors_on == True and abs(filtered_pitch) >= SHUTDOWN_PITCH:
+
+            has_fallen = True
+            file_name  = recorder.make_file_name(FLIGHT_RECORDS_DIRECTORY, 'fall')
+
+            flight_recorder.dump(file_name)
+
+            if debug_mode == True:
+                print("Fall detected: flight record dumped into " + file_name)
+
+        elif has_fallen == True and abs(filtered_pitch) < FALL_RECOVERY_PITCH:
+
+            has_fallen = False
+
+        # Never blocks: telemetry clients pick samples up at their own pace
+        telemetry_buffer.record((balance_scheduler.now(), filtered_pitch, target_angle,
+                                 balance_pid_controller.get_p_value(), balance_pid_controller.get_i_value(), balance_pid_controller.get_d_value(), balance_pid_speed,
+                                 current_speed, target_speed, left_counter, right_counter, relative_yaw_angle,
+                                 robot_odometry.get_x(), robot_odometry.get_y(), robot_odometry.get_heading()))
+
+        if IMU_ACQUISITION_MODE == imu.FIFO_MODE:
+
+            # Loop is paced by the IMU's own sample clock
+            if imu_device.wait_for_data_ready(BALANCE_LOOP_TIME_STEP * 2) == False and debug_mode == True:
+                print("IMU data ready timeout!")
+
+            balance_scheduler.tick()
+
+        else:
+
+            # Sleep until next absolute deadline, overruns being recorded by the scheduler
+            balance_scheduler.wait()
+
 
-        elapsed_time = end_time - start_time
+def wait_for_move(robot_odometry, distance, timeout):
 
-        if elapsed_time < BALANCE_LOOP_TIME_STEP:
-            time.sleep(BALANCE_LOOP_TIME_STEP - elapsed_time)
-        elif debug_mode == True:
-            print("Balance thread is late!")
+    # Wait until robot has travelled given distance (either way), or timeout
+    start_distance = robot_odometry.get_distance()
+    end_time       = time.monotonic() + timeout
 
+    while abs(robot_odometry.get_distance() - start_distance) < distance and time.monotonic() < end_time:
+        time.sleep(0.02)
 
-def obstacles_avoidance_thread(proximity_sensor):
+
+def wait_for_turn(timeout):
+
+    # Turn is over once balance loop has reached ordered yaw angle, or timeout
+    end_time = time.monotonic() + timeout
+
+    while turn_speed_step != 0.0 and time.monotonic() < end_time:
+        time.sleep(0.02)
+
+
+def get_clearest_turn(proximity_sensors):
+
+    # Right by default, left only if left side looks clearer. An unknown distance (no sensor, or no echo yet)
+    # counts as obstacle distance: better than a known obstacle, worse than a known clear way
+    left_distance  = proximity_sensors.get_distance( PROXIMITY_SIDE_DIRECTION)
+    right_distance = proximity_sensors.get_distance(-PROXIMITY_SIDE_DIRECTION)
+
+    if left_distance is None:
+        left_distance = OBSTACLE_DISTANCE
+
+    if right_distance is None:
+        right_distance = OBSTACLE_DISTANCE
+
+    if left_distance > right_distance:
+        return 1
+    else:
+        return -1
+
+
+def order_turn(proximity_sensors, reason):
+
+    global turn_angle_order
+    global turn_speed_step
+
+    turn_direction = get_clearest_turn(proximity_sensors)
+
+    if debug_mode == True:
+        if turn_direction > 0:
+            print(reason + ": turning left")
+        else:
+            print(reason + ": turning right")
+
+    turn_angle_order = relative_yaw_angle + turn_direction * TURNING_ANGLE_STEP * 0.75
+    turn_speed_step  = turn_direction * TURNING_SPEED_STEP
+
+    wait_for_turn(MOVE_TIMEOUT)
+
+
+def obstacles_avoidance_thread(proximity_sensors, robot_odometry):
 
     global is_obstacles_avoidance_on
     global target_speed
@@ -237,25 +479,27 @@ def obstacles_avoidance_thread(proximity_sensor):
     global turn_speed_step
     global relative_yaw_angle
 
-    number_of_samples = 0
-    obstacle_distance_samples = queue.Queue()
+    # Median rejects spurious echoes, range (max - min) tells whether robot is moving at all
+    obstacle_distance_samples = window.RollingStatistics(PROXIMITY_SAMPLES)
     robot_seems_stuck = False
+    distance_sequence = 0
+    forward_sensor    = proximity_sensors.get_sensor(0)
 
     while True:
 
-        next_obstacle_distance = proximity_sensor.get_distance()
-
-        obstacle_distance_samples.put(next_obstacle_distance)
-        number_of_samples += 1
+        # Measured asynchronously by the sensor's ranging thread: only consider fresh distances, as a stale one
+        # appended again and again (lost echoes, timeout) would make robot look stuck
+        new_sequence, next_obstacle_distance = forward_sensor.wait_for_distance(distance_sequence, PROXIMITY_TIMEOUT)
 
-        if number_of_samples >= 3:
+        if new_sequence != distance_sequence:
+            distance_sequence = new_sequence
+            obstacle_distance_samples.append(next_obstacle_distance)
 
-            if max(list(obstacle_distance_samples.queue)) - min(list(obstacle_distance_samples.queue)) < 1:
-                robot_seems_stuck = True
-            else:
-                robot_seems_stuck = False
-
-            obstacle_distance_samples.get()
+        # Nothing in range (all distances clamped to max one) tells nothing about robot moving or not
+        if obstacle_distance_samples.is_full() and obstacle_distance_samples.get_range() < 1 and obstacle_distance_samples.get_max() < proximity.MAX_DISTANCE:
+            robot_seems_stuck = True
+        else:
+            robot_seems_stuck = False
 
         if is_obstacles_avoidance_on == False:
 
@@ -279,7 +523,7 @@ def obstacles_avoidance_thread(proximity_sensor):
 
                 target_speed = -TARGET_SPEED_STEP * 1.10
 
-                time.sleep(1.5)
+                wait_for_move(robot_odometry, STUCK_BACKWARD_DISTANCE, MOVE_TIMEOUT)
 
                 if debug_mode == True:
                     print("Robot seems stuck: stopping")
@@ -288,19 +532,12 @@ def obstacles_avoidance_thread(proximity_sensor):
 
                 time.sleep(1.0)
 
-                if debug_mode == True:
-                    print("Robot seems stuck: turning right")
-
-                turn_angle_order = relative_yaw_angle - TURNING_ANGLE_STEP * 0.75
-                turn_speed_step  = -TURNING_SPEED_STEP
-
-                time.sleep(2.0)
+                order_turn(proximity_sensors, "Robot seems stuck")
 
                 robot_seems_stuck = False
-                number_of_samples = 0
-                obstacle_distance_samples.empty()
+                obstacle_distance_samples.clear()
 
-            elif next_obstacle_distance < OBSTACLE_DISTANCE:
+            elif obstacle_distance_samples.get_median() < OBSTACLE_DISTANCE:
 
                 if debug_mode == True:
                     print("Obstacle ahead: stopping")
@@ -311,13 +548,7 @@ def obstacles_avoidance_thread(proximity_sensor):
 
                 time.sleep(1.0)
 
-                if debug_mode == True:
-                    print("Obstacle ahead: turning right")
-
-                turn_angle_order = relative_yaw_angle - TURNING_ANGLE_STEP * 0.75
-                turn_speed_step  = -TURNING_SPEED_STEP
-
-                time.sleep(2.0)
+                order_turn(proximity_sensors, "Obstacle ahead")
 
             else:
 
@@ -552,7 +783,7 @@ def camera_control_thread():
             time.sleep(0.1)
 
 
-def streaming_control_thread():
+def streaming_control_thread(telemetry_buffer):
 
     global debug_mode
 
@@ -562,8 +793,9 @@ def streaming_control_thread():
             print("Initiating streaming server")
 
         try:
+            # All viewers are served from this single thread, slow ones having frames dropped
             address = ('', 8000)
-            steamer = streamer.StreamingServer(address, streamer.StreamingHandler)
+            steamer = streamer.AsyncStreamingServer(address, streamer.streaming_output, telemetry_buffer)
             steamer.serve_forever()
         except Exception as e:
             if debug_mode == True:
@@ -583,21 +815,27 @@ def print_help():
     print("Enter equilibrium angle value like   : 'a=-3.00'")
     print("Enter equilibrium limit value like   : 'e=0.30'")
     print("Enter complementary filter value like: 'k=0.95'")
+    print("Enter attitude estimator like        : 'f=1' (complementary), 'f=2' (Kalman)")
+    print("Enter speed estimation like          : 'v=0' (distance samples), 'v=1' (encoder edges)")
     print("")
     print("Press c to display current PIDs' values")
     print("Press u to display current IMU's values")
     print("Press o to display other parameters")
+    print("Press t to display & reset balance loop stages timings")
+    print("Enter stages timings state like      : 'n=1' (on), 'n=0' (off)")
+    print("Press r to dump flight recorder's content")
     print("")
     print("Press q to go for operational mode")
     print("Press h to display this help")
     print("")
 
 
-def debug_control_thread(imu_device, proximity_sensor, speed_pid_controller, balance_pid_controller):
+def debug_control_thread(imu_device, imu_sampler, left_encoder, right_encoder, robot_odometry, attitude_estimators, balance_scheduler, balance_profiler, flight_recorder, proximity_sensors, speed_pid_controller, balance_pid_controller):
 
     global debug_mode
     global complementary_filter_factor
-    global distance_readings
+    global attitude_estimator_type
+    global speed_estimation_type
     global distance_samples
     global equilibrium_angle
     global equilibrium_limit
@@ -642,16 +880,43 @@ def debug_control_thread(imu_device, proximity_sensor, speed_pid_controller, bal
                 print("")
             elif command == 'u':
                 print("")
-                imu_device.print_imu_info()
+                # Sampler & FIFO modes: bus is read by sampler/balance thread only, balance loop's last sample is printed
+                imu_device.print_imu_info(IMU_ACQUISITION_MODE == imu.POLLING_MODE)
+                if IMU_ACQUISITION_MODE == imu.SAMPLER_MODE:
+                    imu_sample = imu_sampler.get_latest()
+                    print("")
+                    if imu_sample is not None:
+                        print("Sampler latest sample: #{} at {:.3f} s - raw data: {}".format(imu_sample[0], imu_sample[1], " / ".join([str(word) for word in imu_sample[2]])))
+                    imu_sampler.print_sampler_info()
                 print("")
             elif command == 'o':
                 print("")
                 print("K filter          = {:6} / Distance samples  = {:6}".format(complementary_filter_factor, distance_samples  ))
+                attitude_estimators[attitude_estimator_type].print_estimator_info()
                 print("Equilibrium angle = {:6} / Equilibrium limit = {:6}".format(equilibrium_angle          , equilibrium_limit ))
                 print("Target speed      = {:6.2f} / Turn angle order  = {:6.2f}".format(target_speed         , turn_angle_order  ))
                 print("Filtered pitch    = {:6.2f} / Relative yaw      = {:6.2f}".format(filtered_pitch       , relative_yaw_angle))
                 print("Left encoder      = {:6} / Right encoder     = {:6}".format(left_counter               , right_counter     ))
-                proximity_sensor.print_proximity_info()
+                print("Left encoder : ", end = '')
+                left_encoder.print_encoder_info()
+                print("Right encoder: ", end = '')
+                right_encoder.print_encoder_info()
+                robot_odometry.print_odometry_info()
+                proximity_sensors.print_proximity_info()
+                flight_recorder.print_recorder_info()
+                print("")
+                balance_scheduler.print_scheduler_info()
+                print("")
+            elif command == 'r':
+                print("")
+                file_name = recorder.make_file_name(FLIGHT_RECORDS_DIRECTORY, 'console')
+                flight_recorder.dump(file_name).join()
+                print("Flight record dumped into " + file_name)
+                print("")
+            elif command == 't':
+                print("")
+                balance_profiler.print_profiler_info()
+                balance_profiler.reset()
                 print("")
             elif command == 'q':
                 print("")
@@ -688,20 +953,41 @@ def debug_control_thread(imu_device, proximity_sensor, speed_pid_controller, bal
             elif command == 's':
                 target_speed = value
             elif command == 'm':
-                distance_samples  = value
-                distance_readings = []
+                # Windows are resized by balance thread, at its next cycle (keeping their most recent history)
+                distance_samples = max(1, int(value))
             elif command == 'a':
                 equilibrium_angle = value
             elif command == 'e':
                 equilibrium_limit = value
             elif command == 'k':
-                complementary_filter_factor = value
+                # Beyond this range, filter would diverge (negative time constant)
+                if 0 <= value < 1:
+                    complementary_filter_factor = value
+                    attitude_estimators[COMPLEMENTARY_FILTER].set_factor(value)
+                    flight_recorder.set_configuration(left_encoder.get_resolution(), attitude_estimator_type, complementary_filter_factor)
+                else:
+                    print("Complementary filter factor must be within [0, 1)")
+            elif command == 'v':
+                speed_estimation_type = int(value)
+            elif command == 'n':
+                if value == 0:
+                    balance_profiler.disable()
+                else:
+                    balance_profiler.enable()
+            elif command == 'f':
+                if int(value) in attitude_estimators:
+                    # Start new estimator from current estimate, to avoid any pitch jump
+                    attitude_estimators[int(value)].reset(filtered_pitch)
+                    attitude_estimator_type = int(value)
+                    flight_recorder.set_configuration(left_encoder.get_resolution(), attitude_estimator_type, complementary_filter_factor)
 
 
 def main():
 
     global debug_mode
     global are_motors_on
+    global complementary_filter_factor
+    global equilibrium_limit
 
     if debug_mode == True:
         os.system("clear")
@@ -736,28 +1022,52 @@ def main():
 
     print("")
 
+    with open(SETUP_FILE, 'r') as json_file:
+        setup_data = json.load(json_file)
+
+    # Tuned values (see tune_gains.py), if any, override controller's defaults
+    complementary_filter_factor = setup_data.get('COMPLEMENTARY_FILTER_FACTOR', complementary_filter_factor)
+    equilibrium_limit           = setup_data.get('EQUILIBRIUM_LIMIT'          , equilibrium_limit          )
+
     imu_device                 = imu.ImuDevice()
-    proximity_sensor           = proximity.ProximitySensor(PROXIMITY_SENSOR_TRIGGER_PIN, PROXIMITY_SENSOR_ECHO_PIN)
-    speed_pid_controller       = pid.Pid(SPEED_PID_KP  , SPEED_PID_KI  , SPEED_PID_KD  , SPEED_PID_TARGET  , SPEED_PID_MIN  , SPEED_PID_MAX  , SPEED_PID_WINDUP  )
-    balance_pid_controller     = pid.Pid(BALANCE_PID_KP, BALANCE_PID_KI, BALANCE_PID_KD, BALANCE_PID_TARGET, BALANCE_PID_MIN, BALANCE_PID_MAX, BALANCE_PID_WINDUP)
+    left_motor                 = motor.Motor(const.USE_RPI_GPIO, LEFT_MOTOR_ENABLE , LEFT_MOTOR_PIN_1 , LEFT_MOTOR_PIN_2 , setup_data['LEFT_MOTOR_OFFSET' ])
+    right_motor                = motor.Motor(const.USE_RPI_GPIO, RIGHT_MOTOR_ENABLE, RIGHT_MOTOR_PIN_1, RIGHT_MOTOR_PIN_2, setup_data['RIGHT_MOTOR_OFFSET'])
+    imu_sampler                = imu.ImuSampler(imu_device)
+    left_encoder               = encoder.Encoder(const.USE_RPI_GPIO, LEFT_MOTOR_ENCODER_PIN_1 , LEFT_MOTOR_ENCODER_PIN_2 , ENCODER_DECODING, ENCODER_BOUNCE_TIME)
+    right_encoder              = encoder.Encoder(const.USE_RPI_GPIO, RIGHT_MOTOR_ENCODER_PIN_1, RIGHT_MOTOR_ENCODER_PIN_2, ENCODER_DECODING, ENCODER_BOUNCE_TIME)
+    robot_odometry             = odometry.Odometry(math.pi * WHEEL_DIAMETER / (ENCODER_CYCLES_PER_REVOLUTION * left_encoder.get_resolution()), WHEEL_BASE)
+    proximity_sensors          = proximity.ProximitySensorArray([proximity.ProximitySensor(trigger_pin, echo_pin) for trigger_pin, echo_pin, direction in PROXIMITY_SENSORS],
+                                                                [direction                                      for trigger_pin, echo_pin, direction in PROXIMITY_SENSORS])
+    speed_pid_controller       = controller.make_speed_pid  (setup_data.get('SPEED_PID_KP'  , controller.SPEED_PID_KP  ), setup_data.get('SPEED_PID_KI'  , controller.SPEED_PID_KI  ), setup_data.get('SPEED_PID_KD'  , controller.SPEED_PID_KD  ))
+    balance_pid_controller     = controller.make_balance_pid(setup_data.get('BALANCE_PID_KP', controller.BALANCE_PID_KP), setup_data.get('BALANCE_PID_KI', controller.BALANCE_PID_KI), setup_data.get('BALANCE_PID_KD', controller.BALANCE_PID_KD))
+    balance_controller         = controller.BalanceController(speed_pid_controller, balance_pid_controller, distance_window, time_window)
+    attitude_estimators        = {COMPLEMENTARY_FILTER: estimator.ComplementaryFilter(complementary_filter_factor, BALANCE_LOOP_TIME_STEP),
+                                  KALMAN_FILTER       : estimator.KalmanFilter       ()                                                    }
+    balance_scheduler          = scheduler.PeriodicScheduler(BALANCE_LOOP_TIME_STEP, scheduler.SKIP)
+    balance_profiler           = profiler.StageProfiler(STAGES_NAMES)
+    telemetry_buffer           = telemetry.TelemetryBuffer(TELEMETRY_FIELDS)
+    flight_recorder            = recorder.FlightRecorder(left_encoder.get_resolution(), attitude_estimator_type, complementary_filter_factor, int(FLIGHT_RECORDER_DURATION / BALANCE_LOOP_TIME_STEP))
+
+    # Ranging runs in background, sensors being triggered one after the other, results being picked by obstacles avoidance thread
+    proximity_sensors.start()
 
     bluetooth_control = threading.Thread(target = bluetooth_control_thread, args = [])
     bluetooth_control.start()
 
-    balance_control = threading.Thread(target = balance_control_thread, args = [imu_device, speed_pid_controller, balance_pid_controller])
+    balance_control = threading.Thread(target = balance_control_thread, args = [imu_device, imu_sampler, left_motor, right_motor, left_encoder, right_encoder, robot_odometry, attitude_estimators, balance_scheduler, balance_profiler, telemetry_buffer, flight_recorder, balance_controller, speed_pid_controller, balance_pid_controller])
     balance_control.start()
 
-    obstacles_avoidance = threading.Thread(target = obstacles_avoidance_thread, args = [proximity_sensor])
+    obstacles_avoidance = threading.Thread(target = obstacles_avoidance_thread, args = [proximity_sensors, robot_odometry])
     obstacles_avoidance.start()
 
     camera_control = threading.Thread(target = camera_control_thread, args = [])
     camera_control.start()
 
-    streaming_control = threading.Thread(target = streaming_control_thread, args = [])
+    streaming_control = threading.Thread(target = streaming_control_thread, args = [telemetry_buffer])
     streaming_control.start()
 
     if debug_mode == True:
-        user_input_control = threading.Thread(target = debug_control_thread, args = [imu_device, proximity_sensor, speed_pid_controller, balance_pid_controller])
+        user_input_control = threading.Thread(target = debug_control_thread, args = [imu_device, imu_sampler, left_encoder, right_encoder, robot_odometry, attitude_estimators, balance_scheduler, balance_profiler, flight_recorder, proximity_sensors, speed_pid_controller, balance_pid_controller])
         user_input_control.start()
 
     bluetooth_control.join()
@@ -0,0 +1 @@
+from .scheduler import PeriodicScheduler, CATCH_UP, SKIP
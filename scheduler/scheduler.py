@@ -0,0 +1,151 @@
+import time
+import array
+
+# Policies applied when a deadline has been missed by more than one period
+CATCH_UP = 0
+SKIP     = 1
+
+# Period jitter histogram bins upper bounds, in microseconds (last bin gathers anything above)
+JITTER_BINS = [10, 50, 100, 250, 500, 1000, 2500, 5000]
+
+OVERRUNS_HISTORY = 16
+
+
+class PeriodicScheduler:
+
+    def __init__(self, period, policy = SKIP):
+
+        self.period_ns = int(period * 1000000000)
+        self.policy    = policy
+
+        self.next_deadline_ns = None
+        self.last_tick_ns     = None
+
+        self.reset_statistics()
+
+    def reset_statistics(self):
+
+        self.cycles_count   = 0
+        self.overruns_count = 0
+        self.skipped_count  = 0
+        self.max_jitter_ns  = 0
+        self.max_overrun_ns = 0
+
+        self.jitter_histogram = array.array('L', [0] * (len(JITTER_BINS) + 1))
+
+        # Last overruns: when they occurred, and by how much the deadline was missed
+        self.overruns_times   = array.array('q', [0] * OVERRUNS_HISTORY)
+        self.overruns_lengths = array.array('q', [0] * OVERRUNS_HISTORY)
+
+    def start(self):
+
+        self.last_tick_ns     = time.monotonic_ns()
+        self.next_deadline_ns = self.last_tick_ns + self.period_ns
+
+    def __record_period__(self, now_ns):
+
+        if self.last_tick_ns is not None:
+
+            jitter_ns = abs(now_ns - self.last_tick_ns - self.period_ns)
+            jitter_us = jitter_ns // 1000
+
+            bin_index = 0
+            while bin_index < len(JITTER_BINS) and jitter_us > JITTER_BINS[bin_index]:
+                bin_index += 1
+
+            self.jitter_histogram[bin_index] += 1
+
+            if jitter_ns > self.max_jitter_ns:
+                self.max_jitter_ns = jitter_ns
+
+        self.last_tick_ns  = now_ns
+        self.cycles_count += 1
+
+    def __record_overrun__(self, now_ns, overrun_ns):
+
+        index = self.overruns_count % OVERRUNS_HISTORY
+
+        self.overruns_times  [index] = now_ns
+        self.overruns_lengths[index] = overrun_ns
+
+        self.overruns_count += 1
+
+        if overrun_ns > self.max_overrun_ns:
+            self.max_overrun_ns = overrun_ns
+
+    def wait(self):
+
+        if self.next_deadline_ns is None:
+            self.start()
+
+        now_ns = time.monotonic_ns()
+
+        if now_ns < self.next_deadline_ns:
+
+            time.sleep((self.next_deadline_ns - now_ns) / 1000000000)
+            self.next_deadline_ns += self.period_ns
+
+        else:
+
+            # Cycle's work went past its deadline
+            overrun_ns = now_ns - self.next_deadline_ns
+            self.__record_overrun__(now_ns, overrun_ns)
+
+            missed_periods = overrun_ns // self.period_ns
+
+            if self.policy == SKIP and missed_periods > 0:
+                # Realign on the deadlines grid, dropping missed cycles
+                self.skipped_count    += missed_periods
+                self.next_deadline_ns += (missed_periods + 1) * self.period_ns
+            else:
+                # Run missed cycles back to back, until deadlines are met again
+                self.next_deadline_ns += self.period_ns
+
+        self.__record_period__(time.monotonic_ns())
+
+    def tick(self):
+
+        # For loops paced by some other source (e.g. IMU data ready): only keep track of periods
+        now_ns = time.monotonic_ns()
+
+        if self.last_tick_ns is not None and now_ns - self.last_tick_ns > 2 * self.period_ns:
+            self.__record_overrun__(now_ns, now_ns - self.last_tick_ns - self.period_ns)
+
+        self.__record_period__(now_ns)
+
+    def now(self):
+
+        # Loop's time base, in seconds
+        return time.monotonic()
+
+    def get_cycles_count(self):
+        return self.cycles_count
+
+    def get_overruns_count(self):
+        return self.overruns_count
+
+    def get_skipped_count(self):
+        return self.skipped_count
+
+    def get_jitter_histogram(self):
+        return list(self.jitter_histogram)
+
+    def print_scheduler_info(self):
+
+        print("Cycles = {} - Overruns = {} - Skipped = {} - Max jitter = {:.0f} us - Max overrun = {:.0f} us".format(self.cycles_count,
+                                                                                                                      self.overruns_count,
+                                                                                                                      self.skipped_count,
+                                                                                                                      self.max_jitter_ns  / 1000,
+                                                                                                                      self.max_overrun_ns / 1000))
+
+        labels = ["<= {} us".format(bound) for bound in JITTER_BINS] + ["> {} us".format(JITTER_BINS[-1])]
+        print("Period jitter: " + " / ".join(["{}: {}".format(label, count) for label, count in zip(labels, self.jitter_histogram)]))
+
+        if self.overruns_count > 0:
+
+            now_ns = time.monotonic_ns()
+            first  = max(0, self.overruns_count - OVERRUNS_HISTORY)
+
+            print("Last overruns: " + " / ".join(["{:.1f} s ago by {:.0f} us".format((now_ns - self.overruns_times  [i % OVERRUNS_HISTORY]) / 1000000000,
+                                                                                         self.overruns_lengths[i % OVERRUNS_HISTORY]  / 1000)
+                                                  for i in range(first, self.overruns_count)]))
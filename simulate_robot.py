@@ -0,0 +1,145 @@
+import math
+import json
+import time
+import argparse
+import robot
+import window
+import estimator
+import odometry
+import profiler
+import telemetry
+import recorder
+import controller
+import simulation
+
+SIMULATION_DURATION   = 10.0
+INITIAL_ANGLE         =  5.0
+SIMULATED_RECORDS_DIR = 'simulated_flight_records'
+
+PITCH_INDEX        = robot.TELEMETRY_FIELDS.index('pitch'         )
+TARGET_ANGLE_INDEX = robot.TELEMETRY_FIELDS.index('target_angle'  )
+OUTPUT_INDEX       = robot.TELEMETRY_FIELDS.index('balance_output')
+
+
+def run_simulation(speed_pid_controller, balance_pid_controller, filter_factor = controller.COMPLEMENTARY_FILTER_FACTOR, equilibrium_limit = 0.1,
+                   left_motor_offset = 20, right_motor_offset = 20, target_speed = 0.0, duration = SIMULATION_DURATION, initial_angle = INITIAL_ANGLE,
+                   seed = 0, records_directory = SIMULATED_RECORDS_DIR):
+
+    # Balance loop runs unchanged, only its console/state globals being set for an unattended run
+    robot.debug_mode              = False
+    robot.are_motors_on           = True
+    robot.attitude_estimator_type = robot.COMPLEMENTARY_FILTER
+    robot.speed_estimation_type   = robot.WINDOW_SPEED_ESTIMATION
+    robot.distance_samples        = robot.DISTANCE_SAMPLES
+    robot.equilibrium_limit       = equilibrium_limit
+    robot.target_speed            = target_speed
+    robot.relative_yaw_angle      = 0.0
+    robot.turn_angle_order        = 0.0
+    robot.turn_speed_step         = 0.0
+
+    robot.FLIGHT_RECORDS_DIRECTORY = records_directory
+
+    simulator         = simulation.RobotSimulator(left_motor_offset, right_motor_offset, initial_angle, seed)
+    balance_scheduler = simulation.SimulatedScheduler(simulator, robot.BALANCE_LOOP_TIME_STEP, duration)
+
+    left_motor  , right_motor   = simulator.get_motors  ()
+    left_encoder, right_encoder = simulator.get_encoders()
+
+    robot_odometry      = odometry.Odometry(math.pi * robot.WHEEL_DIAMETER / (simulation.simulator.ENCODER_CYCLES_PER_REVOLUTION * left_encoder.get_resolution()), robot.WHEEL_BASE)
+    balance_controller  = controller.BalanceController(speed_pid_controller, balance_pid_controller, window.MovingWindow(robot.DISTANCE_SAMPLES), window.MovingWindow(robot.DISTANCE_SAMPLES))
+    attitude_estimators = {robot.COMPLEMENTARY_FILTER: estimator.ComplementaryFilter(filter_factor, robot.BALANCE_LOOP_TIME_STEP),
+                           robot.KALMAN_FILTER       : estimator.KalmanFilter       ()                                             }
+    balance_profiler    = profiler.StageProfiler(robot.STAGES_NAMES)
+    telemetry_buffer    = telemetry.TelemetryBuffer(robot.TELEMETRY_FIELDS, int(duration / robot.BALANCE_LOOP_TIME_STEP) + 1)
+    flight_recorder     = recorder.FlightRecorder(left_encoder.get_resolution(), robot.COMPLEMENTARY_FILTER, filter_factor, int(robot.FLIGHT_RECORDER_DURATION / robot.BALANCE_LOOP_TIME_STEP))
+
+    # As if robot had been held still at its initial angle, long enough for the filter to settle
+    attitude_estimators[robot.COMPLEMENTARY_FILTER].reset(simulation.simulator.IMU_PITCH_OFFSET - initial_angle)
+
+    # Never left by itself: stops as soon as simulated time is over
+    try:
+        robot.balance_control_thread(simulator.get_imu_device(), None, left_motor, right_motor, left_encoder, right_encoder, robot_odometry, attitude_estimators,
+                                     balance_scheduler, balance_profiler, telemetry_buffer, flight_recorder, balance_controller, speed_pid_controller, balance_pid_controller)
+    except simulation.SimulationOver:
+        pass
+
+    samples = telemetry_buffer.get_samples(0)[1]
+
+    return simulator, balance_profiler, samples
+
+
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description = "Run balance control loop against a simulated robot, faster than real time")
+
+    parser.add_argument('--duration'     , type = float, default = SIMULATION_DURATION, help = "simulated time, in seconds")
+    parser.add_argument('--angle'        , type = float, default = INITIAL_ANGLE      , help = "initial body angle, in degrees (forward lean positive)")
+    parser.add_argument('--speed'        , type = float, default = 0.0                , help = "target speed, in encoder cycles per second")
+    parser.add_argument('--seed'         , type = int  , default = 0                  , help = "IMU noise seed")
+    parser.add_argument('--speed-kp'     , type = float, default = controller.SPEED_PID_KP  )
+    parser.add_argument('--speed-ki'     , type = float, default = controller.SPEED_PID_KI  )
+    parser.add_argument('--speed-kd'     , type = float, default = controller.SPEED_PID_KD  )
+    parser.add_argument('--balance-kp'   , type = float, default = controller.BALANCE_PID_KP)
+    parser.add_argument('--balance-ki'   , type = float, default = controller.BALANCE_PID_KI)
+    parser.add_argument('--balance-kd'   , type = float, default = controller.BALANCE_PID_KD)
+    parser.add_argument('--factor'       , type = float, default = controller.COMPLEMENTARY_FILTER_FACTOR)
+    parser.add_argument('--limit'        , type = float, default = robot.equilibrium_limit, help = "equilibrium limit, in degrees")
+    parser.add_argument('--csv'          , help = "file to write telemetry samples into")
+
+    return parser.parse_args()
+
+
+def main():
+
+    arguments = parse_arguments()
+
+    # Simulated motors get the very same deadband offsets as the real ones
+    with open(robot.SETUP_FILE, 'r') as json_file:
+        setup_data = json.load(json_file)
+
+    start_time = time.perf_counter()
+
+    simulator, balance_profiler, samples = run_simulation(controller.make_speed_pid  (arguments.speed_kp  , arguments.speed_ki  , arguments.speed_kd  ),
+                                                          controller.make_balance_pid(arguments.balance_kp, arguments.balance_ki, arguments.balance_kd),
+                                                          arguments.factor,
+                                                          arguments.limit,
+                                                          setup_data['LEFT_MOTOR_OFFSET' ],
+                                                          setup_data['RIGHT_MOTOR_OFFSET'],
+                                                          target_speed  = arguments.speed,
+                                                          duration      = arguments.duration,
+                                                          initial_angle = arguments.angle,
+                                                          seed          = arguments.seed)
+
+    elapsed_time = time.perf_counter() - start_time
+
+    pendulum = simulator.get_pendulum()
+    errors   = [sample[PITCH_INDEX] - sample[TARGET_ANGLE_INDEX] for sample in samples]
+
+    print("")
+    print("Simulated {:.1f} s in {:.2f} s ({:.1f}x real time)".format(simulator.get_time(), elapsed_time, simulator.get_time() / elapsed_time))
+    print("Fallen = {} / Pitch error: RMS = {:6.2f} deg - Max = {:6.2f} deg".format(pendulum.get_has_fallen(),
+                                                                                     math.sqrt(sum([error ** 2 for error in errors]) / max(len(errors), 1)),
+                                                                                     max([abs(error) for error in errors], default = 0.0)))
+    print("Final position = {:6.3f} m / Final body angle = {:6.2f} deg".format(pendulum.get_position(), math.degrees(pendulum.get_angle())))
+    print("")
+
+    balance_profiler.print_profiler_info()
+
+    if arguments.csv is not None:
+
+        with open(arguments.csv, 'w') as csv_file:
+
+            csv_file.write(",".join(robot.TELEMETRY_FIELDS) + "\n")
+
+            for sample in samples:
+                csv_file.write(",".join([str(value) for value in sample]) + "\n")
+
+
+if __name__ == '__main__':
+
+    try:
+
+        main()
+
+    except KeyboardInterrupt:
+        print("Keyboard interrupt...")
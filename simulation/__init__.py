@@ -0,0 +1,5 @@
+from .mpu6050 import FakeMpu6050
+from .hcsr04 import FakeHcSr04
+from .camera import FakeCamera
+from .pendulum import PendulumModel
+from .simulator import RobotSimulator, SimulatedScheduler, SimulationOver
\ No newline at end of file
@@ -0,0 +1,71 @@
+import time
+import threading
+
+JPEG_START = b'\xff\xd8'
+JPEG_END   = b'\xff\xd9'
+
+FRAME_RATE = 12
+FRAME_SIZE = 20000
+
+
+class FakeCamera:
+
+    def __init__(self, framerate = FRAME_RATE, frame_size = FRAME_SIZE, chunk_size = None):
+
+        # Frames are written in chunks of given size, or all at once
+        self.framerate  = framerate
+        self.frame_size = frame_size
+        self.chunk_size = chunk_size
+
+        self.frames_count = 0
+
+        self.is_recording = False
+        self.thread       = None
+
+    def start_recording(self, output, format = 'mjpeg'):
+
+        self.is_recording = True
+        self.thread       = threading.Thread(target = self.recording_thread, args = [output], daemon = True)
+        self.thread.start()
+
+    def stop_recording(self):
+
+        self.is_recording = False
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def make_frame(self):
+
+        # Not a decodable JPEG, but framed like one: payload changes on each frame
+        payload = bytes([self.frames_count % 256]) * (self.frame_size - len(JPEG_START) - len(JPEG_END))
+
+        return JPEG_START + payload + JPEG_END
+
+    def recording_thread(self, output):
+
+        next_time = time.monotonic()
+
+        while self.is_recording:
+
+            frame = self.make_frame()
+
+            if self.chunk_size is None:
+                output.write(frame)
+            else:
+                for offset in range(0, len(frame), self.chunk_size):
+                    output.write(frame[offset:offset + self.chunk_size])
+
+            self.frames_count += 1
+
+            next_time += 1 / self.framerate
+            now        = time.monotonic()
+
+            if now < next_time:
+                time.sleep(next_time - now)
+            else:
+                next_time = now
+
+    def get_frames_count(self):
+        return self.frames_count
@@ -0,0 +1,79 @@
+import time
+import threading
+
+SPEED_OF_SOUND = 34300
+
+# Time between end of trigger pulse and start of echo pulse, on a real HC-SR04
+ECHO_LATENCY = 0.0005
+
+
+class FakeEchoPin:
+
+    def __init__(self):
+
+        self.is_active        = False
+        self.when_activated   = None
+        self.when_deactivated = None
+
+    def set_level(self, level):
+
+        self.is_active = level
+
+        if level == True and self.when_activated is not None:
+            self.when_activated()
+        elif level == False and self.when_deactivated is not None:
+            self.when_deactivated()
+
+
+class FakeTriggerPin:
+
+    def __init__(self, sensor):
+
+        self.sensor    = sensor
+        self.is_active = False
+
+    def on(self):
+        self.is_active = True
+
+    def off(self):
+
+        # Echo pulse is emitted on trigger's falling edge
+        if self.is_active == True:
+            self.is_active = False
+            self.sensor.emit_echo()
+
+
+class FakeHcSr04:
+
+    def __init__(self, distance = 100.0):
+
+        # Distance in cm, None for no echo at all (lost echo)
+        self.distance     = distance
+        self.trigger_pin  = FakeTriggerPin(self)
+        self.echo_pin     = FakeEchoPin()
+        self.echoes_count = 0
+
+    def set_distance(self, distance):
+        self.distance = distance
+
+    def emit_echo(self):
+
+        distance = self.distance
+
+        if distance is None:
+            return
+
+        threading.Thread(target = self.echo_thread, args = [2 * distance / SPEED_OF_SOUND], daemon = True).start()
+
+    def echo_thread(self, pulse_duration):
+
+        time.sleep(ECHO_LATENCY)
+        self.echo_pin.set_level(True)
+
+        time.sleep(pulse_duration)
+        self.echo_pin.set_level(False)
+
+        self.echoes_count += 1
+
+    def get_echoes_count(self):
+        return self.echoes_count
@@ -0,0 +1,154 @@
+import time
+import struct
+
+REGISTERS_COUNT = 128
+
+# Registers with a side effect when accessed
+FIFO_EN     = 0x23
+INT_ENABLE  = 0x38
+INT_STATUS  = 0x3A
+USER_CTRL   = 0x6A
+FIFO_COUNTH = 0x72
+FIFO_COUNTL = 0x73
+FIFO_R_W    = 0x74
+
+# First sensor data register (ACCEL_XOUT_H) and its layout
+SENSOR_DATA_REGISTER = 0x3B
+SENSOR_DATA_FORMAT   = struct.Struct('>7h')
+
+# FIFO_EN register bits, in FIFO output order
+TEMP_FIFO_EN  = 0x80
+XG_FIFO_EN    = 0x40
+YG_FIFO_EN    = 0x20
+ZG_FIFO_EN    = 0x10
+ACCEL_FIFO_EN = 0x08
+
+USER_CTRL_FIFO_EN    = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+
+FIFO_OFLOW_INT = 0x10
+DATA_RDY_INT   = 0x01
+
+FIFO_SIZE = 1024
+
+
+# Register-level MPU6050 exposed through an SMBus-like interface, to run without hardware
+class FakeMpu6050:
+
+    def __init__(self, transaction_time = 0.0, byte_time = 0.0):
+
+        self.registers        = bytearray(REGISTERS_COUNT)
+        self.fifo             = bytearray()
+        self.transaction_time = transaction_time
+        self.byte_time        = byte_time
+
+        # Called on each new sample when data ready interrupt is enabled, like the INT pin would
+        self.interrupt_callback = None
+
+        self.transactions_count = 0
+        self.bytes_count        = 0
+
+    def __transfer__(self, length):
+
+        self.transactions_count += 1
+        self.bytes_count        += length
+
+        # Emulate bus occupation: busy wait, as the kernel SMBus driver does not release the GIL
+        duration = self.transaction_time + length * self.byte_time
+        if duration > 0:
+            end_time = time.perf_counter() + duration
+            while time.perf_counter() < end_time:
+                pass
+
+    def __read_register__(self, register):
+
+        if register == FIFO_R_W:
+            if len(self.fifo) == 0:
+                return 0xFF
+            value = self.fifo[0]
+            del self.fifo[0]
+            return value
+        elif register == FIFO_COUNTH:
+            return min(len(self.fifo), FIFO_SIZE) >> 8
+        elif register == FIFO_COUNTL:
+            return min(len(self.fifo), FIFO_SIZE) & 0xFF
+        elif register == INT_STATUS:
+            # Interrupt status is cleared on read
+            value = self.registers[INT_STATUS]
+            self.registers[INT_STATUS] = 0
+            return value
+
+        return self.registers[register]
+
+    def __write_register__(self, register, value):
+
+        if register == USER_CTRL and value & USER_CTRL_FIFO_RESET:
+            self.fifo.clear()
+            value &= ~USER_CTRL_FIFO_RESET
+
+        self.registers[register] = value & 0xFF
+
+    def read_byte_data(self, address, register):
+        self.__transfer__(1)
+        return self.__read_register__(register)
+
+    def write_byte_data(self, address, register, value):
+        self.__transfer__(1)
+        self.__write_register__(register, value)
+
+    def read_i2c_block_data(self, address, register, length):
+
+        self.__transfer__(length)
+
+        # FIFO_R_W does not auto-increment: successive bytes are popped from the FIFO
+        if register == FIFO_R_W:
+            return [self.__read_register__(FIFO_R_W) for i in range(0, length)]
+
+        return [self.__read_register__(register + i) for i in range(0, length)]
+
+    def write_i2c_block_data(self, address, register, data):
+
+        self.__transfer__(len(data))
+
+        for i in range(0, len(data)):
+            self.__write_register__(register + i, data[i])
+
+    def set_sensor_data(self, acceleration_x, acceleration_y, acceleration_z, temperature, gyroscope_x, gyroscope_y, gyroscope_z):
+
+        SENSOR_DATA_FORMAT.pack_into(self.registers, SENSOR_DATA_REGISTER,
+                                     acceleration_x, acceleration_y, acceleration_z,
+                                     temperature,
+                                     gyroscope_x, gyroscope_y, gyroscope_z)
+
+        # A new sample is available: feed FIFO and raise interrupts as configured
+        if self.registers[USER_CTRL] & USER_CTRL_FIFO_EN:
+
+            fifo_enable = self.registers[FIFO_EN]
+            sample      = bytearray()
+
+            if fifo_enable & ACCEL_FIFO_EN:
+                sample += self.registers[0x3B:0x41]
+            if fifo_enable & TEMP_FIFO_EN:
+                sample += self.registers[0x41:0x43]
+            if fifo_enable & XG_FIFO_EN:
+                sample += self.registers[0x43:0x45]
+            if fifo_enable & YG_FIFO_EN:
+                sample += self.registers[0x45:0x47]
+            if fifo_enable & ZG_FIFO_EN:
+                sample += self.registers[0x47:0x49]
+
+            self.fifo += sample
+
+            # Once full, oldest data is overwritten
+            if len(self.fifo) > FIFO_SIZE:
+                del self.fifo[0:len(self.fifo) - FIFO_SIZE]
+                self.registers[INT_STATUS] |= FIFO_OFLOW_INT
+
+        self.registers[INT_STATUS] |= DATA_RDY_INT
+
+        if self.interrupt_callback is not None and self.registers[INT_ENABLE] & DATA_RDY_INT:
+            self.interrupt_callback(None)
+
+    def reset_counters(self):
+        self.transactions_count = 0
+        self.bytes_count        = 0
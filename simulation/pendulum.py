@@ -0,0 +1,140 @@
+import math
+
+GRAVITY = 9.81
+
+# Two-wheeled inverted pendulum, roughly sized like the robot (SI units)
+BODY_MASS          = 0.90
+BODY_HEIGHT        = 0.07
+WHEEL_MASS         = 0.05
+WHEEL_RADIUS       = 0.0325
+WHEEL_BASE         = 0.170
+WHEEL_FRICTION     = 0.002
+YAW_DAMPING        = 0.010
+
+# Geared DC motors, driven at full PWM: torque falls linearly from stall down to zero at no load speed
+MOTOR_STALL_TORQUE   = 0.30
+MOTOR_NO_LOAD_SPEED  = 30.0
+MOTOR_DEADBAND       = 20
+
+# Beyond that, robot lies on the ground
+FALLEN_ANGLE = math.radians(80)
+
+INTEGRATION_STEP = 0.001
+
+
+class PendulumModel:
+
+    def __init__(self, initial_angle = 0.0, left_deadband = MOTOR_DEADBAND, right_deadband = MOTOR_DEADBAND):
+
+        # Body angle from vertical (forward lean positive), wheels' base position & heading
+        self.angle          = initial_angle
+        self.angle_rate     = 0.0
+        self.position       = 0.0
+        self.speed          = 0.0
+        self.heading        = 0.0
+        self.heading_rate   = 0.0
+
+        # Wheels' rotation relative to the body, as seen by the motors' encoders
+        self.left_wheel_angle  = 0.0
+        self.right_wheel_angle = 0.0
+
+        # Below deadband (in PWM percent), motors do not overcome their own friction
+        self.left_deadband  = left_deadband
+        self.right_deadband = right_deadband
+
+        self.left_command  = 0.0
+        self.right_command = 0.0
+
+        self.has_fallen = False
+
+    def set_commands(self, left_command, right_command):
+
+        # Signed PWM duty cycles, as applied by motors drivers (deadband offsets included)
+        self.left_command  = left_command
+        self.right_command = right_command
+
+    def __motor_torque__(self, command, deadband, relative_speed):
+
+        if abs(command) <= deadband:
+            return 0.0
+
+        voltage = math.copysign((abs(command) - deadband) / (100 - deadband), command)
+
+        return MOTOR_STALL_TORQUE * (voltage - relative_speed / MOTOR_NO_LOAD_SPEED)
+
+    def __step__(self, time_step):
+
+        half_base = WHEEL_BASE / 2
+
+        left_relative_speed  = (self.speed + half_base * self.heading_rate) / WHEEL_RADIUS - self.angle_rate
+        right_relative_speed = (self.speed - half_base * self.heading_rate) / WHEEL_RADIUS - self.angle_rate
+
+        left_torque  = self.__motor_torque__(self.left_command , self.left_deadband , left_relative_speed ) - WHEEL_FRICTION * left_relative_speed
+        right_torque = self.__motor_torque__(self.right_command, self.right_deadband, right_relative_speed) - WHEEL_FRICTION * right_relative_speed
+
+        torque = left_torque + right_torque
+
+        if self.has_fallen == False:
+
+            # Lagrange equations of the cart-pole with wheels, motors' reaction applying on the body
+            total_mass   = BODY_MASS + 2 * WHEEL_MASS + 2 * (WHEEL_MASS * WHEEL_RADIUS ** 2 / 2) / WHEEL_RADIUS ** 2
+            body_inertia = BODY_MASS * BODY_HEIGHT ** 2 * 4 / 3
+            coupling     = BODY_MASS * BODY_HEIGHT * math.cos(self.angle)
+
+            force  = torque / WHEEL_RADIUS + BODY_MASS * BODY_HEIGHT * math.sin(self.angle) * self.angle_rate ** 2
+            moment = BODY_MASS * GRAVITY * BODY_HEIGHT * math.sin(self.angle) - torque
+
+            determinant  = total_mass * body_inertia - coupling ** 2
+            acceleration = (body_inertia * force  - coupling * moment) / determinant
+            angle_rate   = (total_mass   * moment - coupling * force ) / determinant
+
+            self.speed      += acceleration * time_step
+            self.angle_rate += angle_rate   * time_step
+            self.position   += self.speed      * time_step
+            self.angle      += self.angle_rate * time_step
+
+            if abs(self.angle) >= FALLEN_ANGLE:
+                self.angle      = math.copysign(FALLEN_ANGLE, self.angle)
+                self.angle_rate = 0.0
+                self.speed      = 0.0
+                self.has_fallen = True
+
+        # Wheels turning in opposite ways make robot turn (positive heading when left wheel is faster)
+        yaw_inertia = BODY_MASS * WHEEL_BASE ** 2 / 12 + 2 * WHEEL_MASS * half_base ** 2
+
+        self.heading_rate += ((left_torque - right_torque) * half_base / WHEEL_RADIUS - YAW_DAMPING * self.heading_rate) / yaw_inertia * time_step
+        self.heading      += self.heading_rate * time_step
+
+        self.left_wheel_angle  += left_relative_speed  * time_step
+        self.right_wheel_angle += right_relative_speed * time_step
+
+    def step(self, time_step):
+
+        steps_count = max(1, int(round(time_step / INTEGRATION_STEP)))
+
+        for i in range(0, steps_count):
+            self.__step__(time_step / steps_count)
+
+    def get_angle(self):
+        return self.angle
+
+    def get_angle_rate(self):
+        return self.angle_rate
+
+    def get_position(self):
+        return self.position
+
+    def get_speed(self):
+        return self.speed
+
+    def get_heading(self):
+        return self.heading
+
+    def get_heading_rate(self):
+        return self.heading_rate
+
+    def get_wheels_angles(self):
+        return self.left_wheel_angle, self.right_wheel_angle
+
+    def get_has_fallen(self):
+        return self.has_fallen
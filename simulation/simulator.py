@@ -0,0 +1,171 @@
+import i2c
+import imu
+import math
+import const
+import motor
+import random
+import encoder
+
+from .mpu6050  import FakeMpu6050
+from .pendulum import PendulumModel
+
+# IMU as mounted on the robot: it reads this pitch when robot stands upright
+IMU_PITCH_OFFSET = -2.5
+TEMPERATURE_RAW  = -1500
+
+# IMU noise (standard deviation) & bias, in raw units
+ACCELERATION_NOISE = 60
+GYROSCOPE_NOISE    = 15
+GYROSCOPE_BIAS     = 40
+
+ENCODER_CYCLES_PER_REVOLUTION = 330
+
+# Encoders count down while motors drive forward: speed PID relies on this wiring
+ENCODER_POLARITY = -1
+
+# Counting up goes through these x4 states, as (pin 1 << 1 | pin 2)
+QUADRATURE_STATES = [3, 1, 0, 2]
+
+
+class SimulationOver(Exception):
+    pass
+
+
+class RobotSimulator:
+
+    def __init__(self, left_motor_offset, right_motor_offset, initial_angle = 0.0, seed = 0):
+
+        # Robot's own classes, on simulation backends: motors are read, encoders & IMU are fed
+        self.mpu6050       = FakeMpu6050()
+        self.imu_device    = imu.ImuDevice(i2c.I2cDevice(self.mpu6050, imu.IMU_ADDRESS), reset_time = 0.0)
+        self.left_motor    = motor.Motor(const.USE_SIMULATION, None, None, None, left_motor_offset )
+        self.right_motor   = motor.Motor(const.USE_SIMULATION, None, None, None, right_motor_offset)
+        self.left_encoder  = encoder.Encoder(const.USE_SIMULATION, None, None, encoder.X4_DECODING, None)
+        self.right_encoder = encoder.Encoder(const.USE_SIMULATION, None, None, encoder.X4_DECODING, None)
+
+        # Motors offsets are the PWM needed to overcome their own friction
+        self.pendulum  = PendulumModel(math.radians(initial_angle), left_motor_offset, right_motor_offset)
+        self.generator = random.Random(seed)
+
+        self.time_ns     = 0
+        self.left_count  = 0
+        self.right_count = 0
+
+        for robot_encoder in [self.left_encoder, self.right_encoder]:
+            robot_encoder.process_state(QUADRATURE_STATES[0] >> 1, QUADRATURE_STATES[0] & 1, 0)
+
+        self.__update_imu__()
+
+    def get_imu_device(self):
+        return self.imu_device
+
+    def get_motors(self):
+        return self.left_motor, self.right_motor
+
+    def get_encoders(self):
+        return self.left_encoder, self.right_encoder
+
+    def get_pendulum(self):
+        return self.pendulum
+
+    def get_time(self):
+        return self.time_ns / 1000000000
+
+    def __get_command__(self, robot_motor):
+
+        # Duty cycle actually applied by the driver, offset included
+        if robot_motor.get_direction() == motor.FORWARD:
+            return robot_motor.get_speed()
+        elif robot_motor.get_direction() == motor.BACKWARD:
+            return -robot_motor.get_speed()
+        else:
+            return 0.0
+
+    def __update_imu__(self):
+
+        pitch      = IMU_PITCH_OFFSET - math.degrees(self.pendulum.get_angle())
+        pitch_rate =                  - math.degrees(self.pendulum.get_angle_rate())
+        yaw_rate   =                    math.degrees(self.pendulum.get_heading_rate())
+
+        noise = self.generator.gauss
+
+        # Gravity only: linear accelerations are neglected
+        raw_data = [-math.sin(math.radians(pitch)) * imu.ACCELERATION_SCALE_FACTOR + noise(0, ACCELERATION_NOISE),
+                                                                                     noise(0, ACCELERATION_NOISE),
+                     math.cos(math.radians(pitch)) * imu.ACCELERATION_SCALE_FACTOR + noise(0, ACCELERATION_NOISE),
+                    TEMPERATURE_RAW,
+                                                          GYROSCOPE_BIAS + noise(0, GYROSCOPE_NOISE),
+                    pitch_rate * imu.GYROSCOPE_SCALE_FACTOR + GYROSCOPE_BIAS + noise(0, GYROSCOPE_NOISE),
+                    yaw_rate   * imu.GYROSCOPE_SCALE_FACTOR + GYROSCOPE_BIAS + noise(0, GYROSCOPE_NOISE)]
+
+        self.mpu6050.set_sensor_data(*[int(max(-32768, min(32767, round(value)))) for value in raw_data])
+
+    def __update_encoder__(self, robot_encoder, count, wheel_angle, start_time_ns, time_step_ns):
+
+        # Quantized wheel angle: each x4 state change gets a timestamp, spread over the step
+        new_count = math.floor(ENCODER_POLARITY * wheel_angle / (2 * math.pi) * ENCODER_CYCLES_PER_REVOLUTION * len(QUADRATURE_STATES))
+        steps     = abs(new_count - count)
+        direction = 1 if new_count > count else -1
+
+        for i in range(1, steps + 1):
+            state = QUADRATURE_STATES[(count + i * direction) % len(QUADRATURE_STATES)]
+            robot_encoder.process_state(state >> 1, state & 1, start_time_ns + time_step_ns * i // steps)
+
+        robot_encoder.set_simulated_time(start_time_ns + time_step_ns)
+
+        return new_count
+
+    def step(self, time_step):
+
+        self.pendulum.set_commands(self.__get_command__(self.left_motor), self.__get_command__(self.right_motor))
+        self.pendulum.step(time_step)
+
+        time_step_ns  = int(round(time_step * 1000000000))
+        start_time_ns = self.time_ns
+        self.time_ns += time_step_ns
+
+        left_wheel_angle, right_wheel_angle = self.pendulum.get_wheels_angles()
+
+        self.left_count  = self.__update_encoder__(self.left_encoder , self.left_count , left_wheel_angle , start_time_ns, time_step_ns)
+        self.right_count = self.__update_encoder__(self.right_encoder, self.right_count, right_wheel_angle, start_time_ns, time_step_ns)
+
+        self.__update_imu__()
+
+
+class SimulatedScheduler:
+
+    # Same interface as scheduler.PeriodicScheduler: instead of sleeping, waiting runs the simulation
+    # over one period, so that the balance loop runs as fast as the host can go
+
+    def __init__(self, simulator, period, duration):
+
+        self.simulator    = simulator
+        self.period       = period
+        self.duration     = duration
+        self.cycles_count = 0
+
+    def start(self):
+        pass
+
+    def now(self):
+        return self.simulator.get_time()
+
+    def wait(self):
+
+        self.simulator.step(self.period)
+        self.cycles_count += 1
+
+        if self.simulator.get_time() >= self.duration:
+            raise SimulationOver()
+
+    def tick(self):
+        self.wait()
+
+    def reset_statistics(self):
+        self.cycles_count = 0
+
+    def get_cycles_count(self):
+        return self.cycles_count
+
+    def print_scheduler_info(self):
+        print("Simulated cycles = {} - Simulated time = {:.3f} s".format(self.cycles_count, self.simulator.get_time()))
@@ -1 +1,2 @@
-from .streamer import StreamingServer, StreamingHandler, IMAGE_WIDTH, IMAGE_HEIGHT, streaming_output
\ No newline at end of file
+from .streamer import StreamingServer, StreamingHandler, StreamingOutput, IMAGE_WIDTH, IMAGE_HEIGHT, streaming_output
+from .async_streamer import AsyncStreamingServer
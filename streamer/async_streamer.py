@@ -0,0 +1,237 @@
+import json
+import math
+import asyncio
+import urllib.parse
+
+from .streamer import PAGE, SNAPSHOT_RETRY_AFTER, is_etag_matching
+
+# Request header section size limit
+MAX_REQUEST_SIZE = 8192
+
+# Frames are dropped for a client while its socket still holds more than this many pending bytes
+MAX_WRITE_BUFFER = 64 * 1024
+
+# Telemetry batches per second, default one being overridden by 'rate' query parameter
+TELEMETRY_RATE     = 10
+TELEMETRY_MIN_RATE =  1
+TELEMETRY_MAX_RATE = 50
+
+
+def parse_rate(query):
+
+    # Telemetry rate from query string, within allowed range, or None if malformed (NaN & infinities included)
+    try:
+        rate = float(urllib.parse.parse_qs(query).get('rate', [TELEMETRY_RATE])[0])
+    except ValueError:
+        return None
+
+    if not math.isfinite(rate):
+        return None
+
+    return min(max(rate, TELEMETRY_MIN_RATE), TELEMETRY_MAX_RATE)
+
+
+class AsyncStreamingServer:
+
+    def __init__(self, address, streaming_output, telemetry_buffer = None):
+
+        self.address          = address
+        self.streaming_output = streaming_output
+        self.telemetry_buffer = telemetry_buffer
+
+        self.loop       = None
+        self.server     = None
+        self.next_frame = None
+
+        self.clients_count  = 0
+        self.sent_frames    = 0
+        self.dropped_frames = 0
+
+    def frame_listener(self):
+
+        # Called from camera's thread: hand over to event loop's thread
+        self.loop.call_soon_threadsafe(self.notify_frame)
+
+    def notify_frame(self):
+
+        # Wake up all clients at once, next ones waiting on a fresh future
+        next_frame      = self.next_frame
+        self.next_frame = self.loop.create_future()
+        next_frame.set_result(None)
+
+    async def wait_for_frame(self, last_sequence):
+
+        while True:
+
+            sequence, frame = self.streaming_output.get_frame()
+
+            if sequence != last_sequence and frame is not None:
+                return sequence, frame
+
+            await self.next_frame
+
+    async def send_response(self, writer, status, headers, content = b'', keep_alive = False):
+
+        if keep_alive == True:
+            lines = ['HTTP/1.1 ' + status, 'Connection: keep-alive']
+        else:
+            lines = ['HTTP/1.1 ' + status, 'Connection: close']
+
+        for name, value in headers:
+            lines.append('{}: {}'.format(name, value))
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + content)
+
+        await writer.drain()
+
+    async def send_stream(self, writer):
+
+        await self.send_response(writer, '200 OK', [('Age'          , 0                                            ),
+                                                    ('Cache-Control', 'no-cache, private'                          ),
+                                                    ('Pragma'       , 'no-cache'                                   ),
+                                                    ('Content-Type' , 'multipart/x-mixed-replace; boundary=FRAME')])
+
+        frame_sequence = self.streaming_output.get_frame()[0]
+
+        while not writer.is_closing():
+
+            frame_sequence, frame = await self.wait_for_frame(frame_sequence)
+
+            # Slow socket: skip this frame rather than queueing it up
+            if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                self.dropped_frames += 1
+                continue
+
+            writer.write('--FRAME\r\nContent-Type: image/jpeg\r\nContent-Length: {}\r\nX-Frame-Sequence: {}\r\n\r\n'.format(len(frame), frame_sequence).encode('latin-1'))
+            writer.write(frame)
+            writer.write(b'\r\n')
+
+            self.sent_frames += 1
+
+    async def send_snapshot(self, writer, if_none_match, keep_alive):
+
+        sequence, frame = self.streaming_output.get_frame()
+
+        if frame is None:
+            await self.send_response(writer, '503 Service Unavailable', [('Retry-After', SNAPSHOT_RETRY_AFTER), ('Content-Length', 0)], keep_alive = keep_alive)
+            return
+
+        etag = self.streaming_output.get_etag(sequence)
+
+        if is_etag_matching(if_none_match, etag):
+            # Poller already has latest frame
+            await self.send_response(writer, '304 Not Modified', [('ETag', etag)], keep_alive = keep_alive)
+        else:
+            await self.send_response(writer, '200 OK', [('ETag'          , etag        ),
+                                                        ('Cache-Control' , 'no-cache'  ),
+                                                        ('Content-Type'  , 'image/jpeg'),
+                                                        ('Content-Length', len(frame)  )], frame, keep_alive)
+
+    async def send_telemetry(self, writer, rate):
+
+        # Server-Sent Events: fields names first, then batches of all samples recorded since previous batch
+        await self.send_response(writer, '200 OK', [('Cache-Control', 'no-cache'         ),
+                                                    ('Content-Type' , 'text/event-stream')])
+
+        writer.write('event: fields\ndata: {}\n\n'.format(json.dumps(self.telemetry_buffer.get_fields_names())).encode('utf-8'))
+
+        last_sequence = self.telemetry_buffer.get_sequence()
+
+        while not writer.is_closing():
+
+            await asyncio.sleep(1 / rate)
+
+            last_sequence, samples, lost_count = self.telemetry_buffer.get_samples(last_sequence)
+
+            batch = {'sequence': last_sequence, 'lost': lost_count, 'samples': samples}
+
+            writer.write('data: {}\n\n'.format(json.dumps(batch)).encode('utf-8'))
+
+            # Slow client: samples keep on being recorded, and are reported as lost if overwritten meanwhile
+            await writer.drain()
+
+    async def handle_client(self, reader, writer):
+
+        self.clients_count += 1
+
+        try:
+            keep_alive = True
+
+            # Several requests per connection, until client asks otherwise or stream is requested
+            while keep_alive == True:
+
+                request = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+
+                method, path, version = request[0].split(' ')
+                headers               = {}
+
+                for line in request[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                if version == 'HTTP/1.1':
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                else:
+                    keep_alive = headers.get('connection', '').lower() == 'keep-alive'
+
+                url  = urllib.parse.urlsplit(path)
+                path = url.path
+
+                if path == '/':
+                    await self.send_response(writer, '301 Moved Permanently', [('Location', '/index.html'), ('Content-Length', 0)], keep_alive = keep_alive)
+                elif path == '/index.html':
+                    content = PAGE.encode('utf-8')
+                    await self.send_response(writer, '200 OK', [('Content-Type', 'text/html'), ('Content-Length', len(content))], content, keep_alive)
+                elif path == '/snapshot.jpg':
+                    await self.send_snapshot(writer, headers.get('if-none-match'), keep_alive)
+                elif path == '/stream.mjpg':
+                    await self.send_stream(writer)
+                    keep_alive = False
+                elif path == '/telemetry' and self.telemetry_buffer is not None:
+                    rate = parse_rate(url.query)
+                    if rate is None:
+                        await self.send_response(writer, '400 Bad Request', [('Content-Length', 0)], keep_alive = keep_alive)
+                    else:
+                        await self.send_telemetry(writer, rate)
+                        keep_alive = False
+                else:
+                    await self.send_response(writer, '404 Not Found', [('Content-Length', 0)], keep_alive = keep_alive)
+        except (Exception, asyncio.CancelledError) as e:
+            # Client went away, or server is shutting down
+            pass
+        finally:
+            self.clients_count -= 1
+            writer.close()
+
+    async def serve(self):
+
+        self.loop       = asyncio.get_running_loop()
+        self.next_frame = self.loop.create_future()
+
+        self.streaming_output.add_listener(self.frame_listener)
+
+        try:
+            self.server = await asyncio.start_server(self.handle_client, self.address[0], self.address[1], limit = MAX_REQUEST_SIZE, reuse_address = True)
+
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.streaming_output.remove_listener(self.frame_listener)
+
+    def serve_forever(self):
+
+        # All clients are served from calling thread
+        try:
+            asyncio.run(self.serve())
+        except asyncio.CancelledError:
+            pass
+
+    def shutdown(self):
+
+        # Can be called from any thread
+        if self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+
+    def print_streamer_info(self):
+        print("Streaming clients: {} - Sent frames: {} - Dropped frames: {}".format(self.clients_count, self.sent_frames, self.dropped_frames))
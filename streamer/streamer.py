@@ -1,4 +1,4 @@
-import io
+import time
 import socketserver
 
 from threading import Condition
@@ -17,26 +17,97 @@ PAGE = """\
 """
 
 
+JPEG_START = b'\xff\xd8'
+JPEG_END   = b'\xff\xd9'
+
+# Snapshot pollers are expected to revalidate their cached frame on each request
+SNAPSHOT_RETRY_AFTER = 1
+
+
+def is_etag_matching(if_none_match, etag):
+
+    # If-None-Match holds either '*' or a list of entity tags
+    if if_none_match is None:
+        return False
+
+    return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+
+
 class StreamingOutput:
 
     def __init__(self):
+
+        # Double buffering: chunks of the frame being written, and last complete (immutable) frame
+        self.chunks    = []
         self.frame     = None
-        self.buffer    = io.BytesIO()
+        self.sequence  = 0
         self.condition = Condition()
 
+        # Entity tags stay unique across restarts, frames sequence starting over from 0
+        self.etag_prefix = '{:x}'.format(time.time_ns())
+
+        # Called (from camera's thread) on each new frame, for servers not waiting on the condition
+        self.listeners = []
+
+    def publish_frame(self):
+
+        # Single chunk frames are handed out as is, others are joined: at most one copy per frame
+        if len(self.chunks) == 1 and isinstance(self.chunks[0], bytes):
+            frame = self.chunks[0]
+        else:
+            frame = b''.join(self.chunks)
+
+        self.chunks = []
+
+        with self.condition:
+            self.frame     = frame
+            self.sequence += 1
+            self.condition.notify_all()
+
+        for listener in self.listeners:
+            listener()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
     def write(self, buffer):
-        if buffer.startswith(b'\xff\xd8'):
-            # New frame, copy the existing buffer's content and notify clients it's available
-            self.buffer.truncate()
-            with self.condition:
-                self.frame = self.buffer.getvalue()
-                self.condition.notify_all()
-            self.buffer.seek(0)
-        return self.buffer.write(buffer)
+
+        # New frame while previous one was not terminated: publish it anyway
+        if buffer.startswith(JPEG_START) and self.chunks:
+            self.publish_frame()
+
+        self.chunks.append(buffer)
+
+        # Frame is complete: publish it right away, rather than on next frame's start
+        if buffer.endswith(JPEG_END):
+            self.publish_frame()
+
+        return len(buffer)
+
+    def get_frame(self):
+
+        with self.condition:
+            return self.sequence, self.frame
+
+    def get_etag(self, sequence):
+        return '"{}-{}"'.format(self.etag_prefix, sequence)
+
+    def wait_for_frame(self, last_sequence, timeout = None):
+
+        # Newest frame, as soon as it is newer than last one: frames in between are skipped, not queued
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != last_sequence, timeout)
+            return self.sequence, self.frame
 
 
 class StreamingHandler(server.BaseHTTPRequestHandler):
 
+    # Keep-alive connections, for pollers
+    protocol_version = 'HTTP/1.1'
+
     def log_message(self, format, *args):
         pass
 
@@ -45,6 +116,7 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
         if self.path == '/':
             self.send_response(301)
             self.send_header('Location', '/index.html')
+            self.send_header('Content-Length', 0)
             self.end_headers()
         elif self.path == '/index.html':
             content = PAGE.encode('utf-8')
@@ -53,20 +125,44 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
             self.send_header('Content-Length', len(content))
             self.end_headers()
             self.wfile.write(content)
+        elif self.path == '/snapshot.jpg':
+            sequence, frame = streaming_output.get_frame()
+            if frame is None:
+                self.send_response(503)
+                self.send_header('Retry-After', SNAPSHOT_RETRY_AFTER)
+                self.send_header('Content-Length', 0)
+                self.end_headers()
+            elif is_etag_matching(self.headers.get('If-None-Match'), streaming_output.get_etag(sequence)):
+                # Poller already has latest frame
+                self.send_response(304)
+                self.send_header('ETag', streaming_output.get_etag(sequence))
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header('ETag', streaming_output.get_etag(sequence))
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', len(frame))
+                self.end_headers()
+                self.wfile.write(frame)
         elif self.path == '/stream.mjpg':
+            # Stream ends with the connection
+            self.close_connection = True
             self.send_response(200)
             self.send_header('Age', 0)
             self.send_header('Cache-Control', 'no-cache, private')
             self.send_header('Pragma', 'no-cache')
+            self.send_header('Connection', 'close')
             self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
             self.end_headers()
+            frame_sequence = streaming_output.get_frame()[0]
             try:
                 while True:
-                    with streaming_output.condition:
-                        streaming_output.condition.wait()
-                        frame = streaming_output.frame
+                    # A slow client gets the newest frame, sequence number telling it how many were skipped
+                    frame_sequence, frame = streaming_output.wait_for_frame(frame_sequence)
                     self.wfile.write(b'--FRAME\r\n')
                     self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('X-Frame-Sequence', frame_sequence)
                     self.send_header('Content-Length', len(frame))
                     self.end_headers()
                     self.wfile.write(frame)
@@ -75,7 +171,6 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
                 pass
         else:
             self.send_error(404)
-            self.end_headers()
 
 
 class StreamingServer(socketserver.ThreadingMixIn, server.HTTPServer):
@@ -0,0 +1 @@
+from .telemetry import TelemetryBuffer
@@ -0,0 +1,56 @@
+import array
+
+DEFAULT_CAPACITY = 1024
+
+
+class TelemetryBuffer:
+
+    def __init__(self, fields_names, capacity = DEFAULT_CAPACITY):
+
+        self.fields_names = fields_names
+        self.fields_count = len(fields_names)
+        self.capacity     = capacity
+
+        # Ring buffer of samples, written by a single (control) thread which never waits for readers
+        self.data = array.array('d', [0.0] * capacity * self.fields_count)
+
+        # Number of samples written so far: last sample index is (sequence - 1) % capacity
+        self.sequence = 0
+
+    def record(self, values):
+
+        offset = (self.sequence % self.capacity) * self.fields_count
+
+        for i in range(0, self.fields_count):
+            self.data[offset + i] = values[i]
+
+        # Publish sample only once fully written
+        self.sequence += 1
+
+    def get_fields_names(self):
+        return self.fields_names
+
+    def get_sequence(self):
+        return self.sequence
+
+    def get_samples(self, last_sequence):
+
+        # Samples written since last sequence, along with the number of those lost (overwritten meanwhile)
+        while True:
+
+            sequence = self.sequence
+
+            first_sequence = max(last_sequence, sequence - self.capacity + 1)
+            lost_count     = first_sequence - last_sequence
+            samples        = []
+
+            for i in range(first_sequence, sequence):
+                offset = (i % self.capacity) * self.fields_count
+                samples.append(self.data[offset:offset + self.fields_count].tolist())
+
+            # Retry if the writer lapped the ring buffer while reading
+            if self.sequence - first_sequence < self.capacity:
+                return sequence, samples, lost_count
+
+    def print_telemetry_info(self):
+        print("Telemetry samples: {} - Fields: {}".format(self.sequence, ', '.join(self.fields_names)))
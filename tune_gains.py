@@ -0,0 +1,231 @@
+import os
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import concurrent.futures
+import robot
+import controller
+import simulate_robot
+
+# Tuned parameters: their setup file keys, defaults and search ranges
+PARAMETERS = {'speed_kp'         : ('SPEED_PID_KP'               , controller.SPEED_PID_KP               , 0.000,   0.050),
+              'speed_ki'         : ('SPEED_PID_KI'               , controller.SPEED_PID_KI               , 0.000,   0.300),
+              'speed_kd'         : ('SPEED_PID_KD'               , controller.SPEED_PID_KD               , 0.000,   0.005),
+              'balance_kp'       : ('BALANCE_PID_KP'             , controller.BALANCE_PID_KP             , 5.000,  40.000),
+              'balance_ki'       : ('BALANCE_PID_KI'             , controller.BALANCE_PID_KI             , 0.000, 200.000),
+              'balance_kd'       : ('BALANCE_PID_KD'             , controller.BALANCE_PID_KD             , 0.000,   0.600),
+              'filter_factor'    : ('COMPLEMENTARY_FILTER_FACTOR', controller.COMPLEMENTARY_FILTER_FACTOR, 0.990,   0.999),
+              'equilibrium_limit': ('EQUILIBRIUM_LIMIT'          , robot.equilibrium_limit               , 0.000,   0.500)}
+
+GRID_SEARCH   = 'grid'
+RANDOM_SEARCH = 'random'
+
+# Every candidate goes through the same scenarios (initial lean in degrees, target speed), with the same noise seeds
+SCENARIOS         = [(5.0, 0.0), (-5.0, 0.0), (0.0, robot.TARGET_SPEED_STEP)]
+SCENARIO_DURATION = 8.0
+
+# Pitch is settled once it stays within this band around equilibrium angle (degrees)
+SETTLING_BAND = 1.0
+
+# Cost of a candidate: settling time (s), overshoot (degrees) and mean motor command (PWM %), averaged over scenarios
+SETTLING_WEIGHT  = 1.00
+OVERSHOOT_WEIGHT = 0.20
+EFFORT_WEIGHT    = 0.02
+
+
+def compute_metrics(samples, initial_angle):
+
+    # Errors around equilibrium angle, positive when leaning backward (initial lean's opposite sign)
+    errors = [sample[simulate_robot.PITCH_INDEX] - robot.equilibrium_angle for sample in samples]
+
+    if len(errors) == 0 or max([abs(error) for error in errors]) >= robot.SHUTDOWN_PITCH:
+        return None
+
+    settling_index = len(errors)
+    while settling_index > 0 and abs(errors[settling_index - 1]) <= SETTLING_BAND:
+        settling_index -= 1
+
+    settling_time = settling_index * robot.BALANCE_LOOP_TIME_STEP
+
+    # Swing past equilibrium, on the side opposite to initial lean (either side if robot started upright)
+    if initial_angle > 0:
+        overshoot = max(0.0, max(errors))
+    elif initial_angle < 0:
+        overshoot = max(0.0, -min(errors))
+    else:
+        overshoot = max([abs(error) for error in errors])
+
+    effort = sum([abs(sample[simulate_robot.OUTPUT_INDEX]) for sample in samples]) / len(samples)
+
+    return settling_time, overshoot, effort
+
+
+def evaluate_candidate(arguments):
+
+    # Run in pool's worker processes: a fresh simulation per scenario, deterministic for a given seed
+    candidate, seed, duration, motors_offsets, records_directory = arguments
+
+    metrics = []
+
+    for index, (initial_angle, target_speed) in enumerate(SCENARIOS):
+
+        simulator, balance_profiler, samples = simulate_robot.run_simulation(controller.make_speed_pid  (candidate['speed_kp'  ], candidate['speed_ki'  ], candidate['speed_kd'  ]),
+                                                                             controller.make_balance_pid(candidate['balance_kp'], candidate['balance_ki'], candidate['balance_kd']),
+                                                                             candidate['filter_factor'],
+                                                                             candidate['equilibrium_limit'],
+                                                                             motors_offsets[0],
+                                                                             motors_offsets[1],
+                                                                             target_speed      = target_speed,
+                                                                             duration          = duration,
+                                                                             initial_angle     = initial_angle,
+                                                                             seed              = seed + index,
+                                                                             records_directory = records_directory)
+
+        scenario_metrics = compute_metrics(samples, initial_angle)
+
+        # One fall is enough to disqualify a candidate
+        if scenario_metrics is None:
+            return None
+
+        metrics.append(scenario_metrics)
+
+    return [sum(values) / len(values) for values in zip(*metrics)]
+
+
+def get_cost(metrics):
+
+    if metrics is None:
+        return math.inf
+
+    settling_time, overshoot, effort = metrics
+
+    return SETTLING_WEIGHT * settling_time + OVERSHOOT_WEIGHT * overshoot + EFFORT_WEIGHT * effort
+
+
+def make_candidates(search, names, points, count, generator):
+
+    defaults = {name: PARAMETERS[name][1] for name in PARAMETERS}
+
+    # Current gains are always part of the candidates, as a reference
+    candidates = [defaults]
+
+    if search == GRID_SEARCH:
+
+        axes = [[PARAMETERS[name][2] + (PARAMETERS[name][3] - PARAMETERS[name][2]) * i / max(points - 1, 1) for i in range(0, points)] for name in names]
+
+        for index in range(0, points ** len(names)):
+            candidate = dict(defaults)
+            for axis_index, name in enumerate(names):
+                candidate[name] = axes[axis_index][(index // points ** axis_index) % points]
+            candidates.append(candidate)
+
+    else:
+
+        for index in range(0, count):
+            candidate = dict(defaults)
+            for name in names:
+                candidate[name] = generator.uniform(PARAMETERS[name][2], PARAMETERS[name][3])
+            candidates.append(candidate)
+
+    return candidates
+
+
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description = "Search PID gains, filter factor & equilibrium limit over closed-loop simulations, on all cores")
+
+    parser.add_argument('--search'    , choices = [GRID_SEARCH, RANDOM_SEARCH], default = RANDOM_SEARCH)
+    parser.add_argument('--parameters', nargs = '+', choices = list(PARAMETERS), default = list(PARAMETERS), help = "parameters to search, others keeping their current value")
+    parser.add_argument('--points'    , type = int  , default = 3                , help = "grid points per parameter")
+    parser.add_argument('--candidates', type = int  , default = 200              , help = "random candidates count")
+    parser.add_argument('--seed'      , type = int  , default = 0                , help = "seed of random search & of simulations' noise")
+    parser.add_argument('--duration'  , type = float, default = SCENARIO_DURATION, help = "simulated time per scenario, in seconds")
+    parser.add_argument('--workers'   , type = int  , default = os.cpu_count()   , help = "worker processes count")
+    parser.add_argument('--top'       , type = int  , default = 10               , help = "best candidates to display")
+    parser.add_argument('--dry-run'   , action = 'store_true'                    , help = "do not write best candidate into setup file")
+
+    return parser.parse_args()
+
+
+def main():
+
+    arguments = parse_arguments()
+
+    with open(robot.SETUP_FILE, 'r') as json_file:
+        setup_data = json.load(json_file)
+
+    # Search starts from setup file's current values, if any
+    for name, (key, default, minimum, maximum) in PARAMETERS.items():
+        if key in setup_data:
+            PARAMETERS[name] = (key, setup_data[key], minimum, maximum)
+
+    candidates     = make_candidates(arguments.search, arguments.parameters, arguments.points, arguments.candidates, random.Random(arguments.seed))
+    motors_offsets = (setup_data['LEFT_MOTOR_OFFSET'], setup_data['RIGHT_MOTOR_OFFSET'])
+
+    print("Evaluating {} candidates x {} scenarios over {} processes...".format(len(candidates), len(SCENARIOS), arguments.workers))
+
+    start_time = time.perf_counter()
+
+    # Falls' flight records are of no use here
+    with tempfile.TemporaryDirectory() as records_directory:
+
+        tasks = [(candidate, arguments.seed, arguments.duration, motors_offsets, records_directory) for candidate in candidates]
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers = arguments.workers) as executor:
+            results = list(executor.map(evaluate_candidate, tasks, chunksize = max(1, len(tasks) // (arguments.workers * 4))))
+
+    elapsed_time = time.perf_counter() - start_time
+
+    # Stable sort: equal costs keep candidates' order, for reproducible rankings
+    ranking = sorted(range(0, len(candidates)), key = lambda index: get_cost(results[index]))
+    fallen  = len([metrics for metrics in results if metrics is None])
+
+    print("Done in {:.1f} s ({:.1f} simulated seconds per second) - {} candidates fell".format(elapsed_time,
+                                                                                              len(tasks) * len(SCENARIOS) * arguments.duration / elapsed_time,
+                                                                                              fallen))
+    print("")
+    print("Rank |   Cost | Settling | Overshoot | Effort | " + " | ".join(PARAMETERS))
+
+    for rank, index in enumerate(ranking[0:arguments.top]):
+
+        if results[index] is None:
+            break
+
+        settling_time, overshoot, effort = results[index]
+
+        print("{:4} | {:6.3f} | {:6.3f} s | {:5.2f} deg | {:6.1f} | ".format(rank + 1, get_cost(results[index]), settling_time, overshoot, effort) +
+              " | ".join(["{:>{}.4f}".format(candidates[index][name], len(name)) for name in PARAMETERS]) +
+              (" (current)" if index == 0 else ""))
+
+    print("")
+
+    best_index = ranking[0]
+
+    if results[best_index] is None:
+        print("No candidate kept robot balanced: setup file left unchanged")
+    elif best_index == 0:
+        print("Current values are the best ones: setup file left unchanged")
+    elif arguments.dry_run == True:
+        print("Dry run: setup file left unchanged")
+    else:
+
+        for name, (key, default, minimum, maximum) in PARAMETERS.items():
+            setup_data[key] = round(candidates[best_index][name], 6)
+
+        with open(robot.SETUP_FILE, "w") as json_file:
+            json.dump(setup_data, json_file, indent=4)
+
+        print("Best values written into " + robot.SETUP_FILE)
+
+
+if __name__ == '__main__':
+
+    try:
+
+        main()
+
+    except KeyboardInterrupt:
+        print("Keyboard interrupt...")
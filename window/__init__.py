@@ -0,0 +1,2 @@
+from .window import MovingWindow
+from .statistics import RollingStatistics
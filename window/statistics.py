@@ -0,0 +1,149 @@
+import heapq
+import array
+import collections
+
+# Heap holding a window's value, for median
+LOW_SIDE  = 0
+HIGH_SIDE = 1
+
+
+class RollingStatistics:
+
+    __slots__ = ['capacity', 'values', 'sides', 'position', 'count', 'low_heap', 'high_heap', 'low_count', 'high_count', 'min_indexes', 'max_indexes']
+
+    def __init__(self, capacity):
+
+        self.capacity = capacity
+        self.values   = array.array('d', [0.0] * capacity)
+        self.sides    = bytearray(capacity)
+        self.clear()
+
+    def clear(self):
+
+        # Position is the absolute index of next value, count the number of values in window
+        self.position = 0
+        self.count    = 0
+
+        # Running median: lower half in a max-heap, upper half in a min-heap, as (value, absolute index) entries.
+        # Values leaving the window are deleted lazily, once they reach a heap's top: O(log n) amortized per value
+        self.low_heap   = []
+        self.high_heap  = []
+        self.low_count  = 0
+        self.high_count = 0
+
+        # Monotonic deques of absolute indexes: front one is always current min/max
+        self.min_indexes = collections.deque()
+        self.max_indexes = collections.deque()
+
+    def append(self, value):
+
+        index = self.position % self.capacity
+
+        # Oldest value (if any) leaves window as new one enters it
+        if self.count == self.capacity:
+            if self.sides[index] == LOW_SIDE:
+                self.low_count  -= 1
+            else:
+                self.high_count -= 1
+        else:
+            self.count += 1
+
+        oldest_position = self.position - self.capacity
+
+        if self.min_indexes and self.min_indexes[0] <= oldest_position:
+            self.min_indexes.popleft()
+
+        if self.max_indexes and self.max_indexes[0] <= oldest_position:
+            self.max_indexes.popleft()
+
+        # Values that can no longer be min/max (new one is smaller/larger and lasts longer) are dropped
+        while self.min_indexes and self.values[self.min_indexes[-1] % self.capacity] >= value:
+            self.min_indexes.pop()
+
+        while self.max_indexes and self.values[self.max_indexes[-1] % self.capacity] <= value:
+            self.max_indexes.pop()
+
+        self.values[index] = value
+
+        self.min_indexes.append(self.position)
+        self.max_indexes.append(self.position)
+
+        self.position += 1
+
+        self.__insert_median__(value, self.position - 1)
+
+    def __prune__(self, heap):
+
+        # Drop top entries which already left the window
+        while heap and heap[0][1] < self.position - self.capacity:
+            heapq.heappop(heap)
+
+    def __insert_median__(self, value, position):
+
+        index = position % self.capacity
+
+        self.__prune__(self.low_heap)
+
+        if self.low_heap and value > -self.low_heap[0][0]:
+            heapq.heappush(self.high_heap, (value, position))
+            self.sides[index] = HIGH_SIDE
+            self.high_count  += 1
+        else:
+            heapq.heappush(self.low_heap, (-value, position))
+            self.sides[index] = LOW_SIDE
+            self.low_count   += 1
+
+        # Keep halves balanced, lower one holding the extra value if any
+        if self.low_count > self.high_count + 1:
+            self.__prune__(self.low_heap)
+            negated_value, moved_position = heapq.heappop(self.low_heap)
+            heapq.heappush(self.high_heap, (-negated_value, moved_position))
+            self.sides[moved_position % self.capacity] = HIGH_SIDE
+            self.low_count  -= 1
+            self.high_count += 1
+        elif self.high_count > self.low_count:
+            self.__prune__(self.high_heap)
+            moved_value, moved_position = heapq.heappop(self.high_heap)
+            heapq.heappush(self.low_heap, (-moved_value, moved_position))
+            self.sides[moved_position % self.capacity] = LOW_SIDE
+            self.high_count -= 1
+            self.low_count  += 1
+
+        # Deleted entries buried deep down the heaps: rebuild them from the window's values only
+        if len(self.low_heap) + len(self.high_heap) > 2 * self.capacity:
+            first_position = self.position - self.capacity
+            self.low_heap  = [entry for entry in self.low_heap  if entry[1] >= first_position]
+            self.high_heap = [entry for entry in self.high_heap if entry[1] >= first_position]
+            heapq.heapify(self.low_heap )
+            heapq.heapify(self.high_heap)
+
+    def is_full(self):
+        return self.count == self.capacity
+
+    def get_capacity(self):
+        return self.capacity
+
+    def get_count(self):
+        return self.count
+
+    def get_min(self):
+        return self.values[self.min_indexes[0] % self.capacity] if self.count > 0 else 0.0
+
+    def get_max(self):
+        return self.values[self.max_indexes[0] % self.capacity] if self.count > 0 else 0.0
+
+    def get_range(self):
+        return self.get_max() - self.get_min()
+
+    def get_median(self):
+
+        if self.count == 0:
+            return 0.0
+
+        self.__prune__(self.low_heap )
+        self.__prune__(self.high_heap)
+
+        if self.count % 2 == 1:
+            return -self.low_heap[0][0]
+        else:
+            return (-self.low_heap[0][0] + self.high_heap[0][0]) / 2
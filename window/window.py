@@ -0,0 +1,68 @@
+import array
+
+
+class MovingWindow:
+
+    __slots__ = ['capacity', 'values', 'index', 'count', 'sum']
+
+    def __init__(self, capacity):
+
+        self.capacity = capacity
+        self.values   = array.array('d', [0.0] * capacity)
+        self.index    = 0
+        self.count    = 0
+        self.sum      = 0.0
+
+    def clear(self):
+
+        self.index = 0
+        self.count = 0
+        self.sum   = 0.0
+
+    def append(self, value):
+
+        # Oldest value (if any) leaves window as new one enters it
+        if self.count == self.capacity:
+            self.sum -= self.values[self.index]
+        else:
+            self.count += 1
+
+        self.values[self.index] = value
+        self.sum               += value
+        self.index             += 1
+
+        if self.index == self.capacity:
+            self.index = 0
+            # Once per lap, get rid of accumulated floating point rounding errors
+            if self.count == self.capacity:
+                self.sum = sum(self.values)
+
+    def resize(self, capacity):
+
+        # Keep as much of the most recent history as fits into new capacity
+        kept_count = min(self.count, capacity)
+        values     = array.array('d', [0.0] * capacity)
+
+        for i in range(0, kept_count):
+            values[kept_count - 1 - i] = self.values[(self.index - 1 - i) % self.capacity]
+
+        self.capacity = capacity
+        self.values   = values
+        self.count    = kept_count
+        self.index    = kept_count % capacity
+        self.sum      = sum(values[0:kept_count])
+
+    def is_full(self):
+        return self.count == self.capacity
+
+    def get_capacity(self):
+        return self.capacity
+
+    def get_count(self):
+        return self.count
+
+    def get_sum(self):
+        return self.sum
+
+    def get_average(self):
+        return self.sum / self.count if self.count > 0 else 0.0